@@ -0,0 +1,153 @@
+"""simulate batches of flings headlessly and stream out what happened
+
+Jobs are JSON lines, read from files or stdin, each with a level (index or
+name), the launch position and velocity, and optionally the board size, how
+many ticks to give it and an id to copy into the result:
+
+    {"id": 7, "level": "wally", "pos": [120, 300], "velocity": [6.5, 1]}
+
+Every job is run in a process pool and gets one JSON line back, in the same
+order as the jobs:
+
+    {"id": 7, "job": 0, "level": "Wally", "won": false, "ticks": 412,
+     "goals_hit": 3, "goals": 5}
+
+where job is the job's line number. A line that can't be run gets an
+"error" in place of the results.
+
+    python main.py batch shots.jsonl > results.jsonl
+"""
+
+import argparse
+import fileinput
+import json
+import multiprocessing
+import sys
+
+from levels import level_numbers, levels
+from solver import find_level, run_fling
+
+DEFAULT_TICKS = 900
+
+
+def check_number(value, name):
+    """value, if it's a JSON number; raises ValueError if it isn't"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("%s should be a number, not %r" % (name, value))
+    return value
+
+
+def check_pair(value, name):
+    """(x, y) for a JSON pair of numbers; raises ValueError for anything
+    else"""
+    if not isinstance(value, list) or len(value) != 2:
+        raise ValueError("%s should be a pair of numbers, not %r" % (
+            name, value))
+    return check_number(value[0], name), check_number(value[1], name)
+
+
+def parse_job(line, width=800, height=600, max_ticks=DEFAULT_TICKS):
+    """(id, level index, width, height, pos, velocity, ticks) for a job's
+    JSON line; raises ValueError or KeyError for a line that isn't a
+    job"""
+    spec = json.loads(line)
+    if not isinstance(spec, dict):
+        raise ValueError("a job should be a JSON object, not %r" % (spec,))
+    level = spec['level']
+    if isinstance(level, int) and not isinstance(level, bool):
+        if not 0 <= level < len(levels):
+            raise ValueError("no level %s" % level)
+    elif isinstance(level, type(u'')):
+        level = level_numbers[find_level(level)]
+    else:
+        raise ValueError("level should be an index or a name, not %r" % (
+            level,))
+    return (spec.get('id'), level,
+            check_number(spec.get('width', width), 'width'),
+            check_number(spec.get('height', height), 'height'),
+            check_pair(spec['pos'], 'pos'),
+            check_pair(spec['velocity'], 'velocity'),
+            check_number(spec.get('ticks', max_ticks), 'ticks'))
+
+
+def simulate(job):
+    """run a (job number, JSON line, (default width, height, ticks)) job;
+    returns its result as a dict, which has an error instead if the line
+    couldn't be made sense of or the job failed. Nothing is raised, as
+    that would stop the whole batch"""
+    number, line, defaults = job
+    try:
+        job_id, level_index, width, height, pos, velocity, max_ticks = \
+            parse_job(line, *defaults)
+        level = levels[level_index]
+        simulation, goals = run_fling(level, width, height, pos, velocity,
+                                      max_ticks)
+    except Exception as e:
+        return {'job': number, 'error': '%s: %s' % (type(e).__name__, e)}
+
+    result = {
+        'job': number,
+        'level': level.__name__,
+        'won': simulation.complete,
+        'ticks': simulation.ticks,
+        'goals_hit': goals - len(simulation.goal_points),
+        'goals': goals,
+    }
+    if job_id is not None:
+        result['id'] = job_id
+    return result
+
+
+def read_jobs(lines, width=800, height=600, max_ticks=DEFAULT_TICKS):
+    """jobs for simulate from JSON lines, skipping blank ones; the lines
+    are parsed by the workers, so a big batch streams through"""
+    defaults = (width, height, max_ticks)
+    for number, line in enumerate(lines):
+        if line.strip():
+            yield number, line, defaults
+
+
+def run(jobs, output, processes=None, chunksize=32, ordered=True):
+    """simulate jobs in a pool, writing each result to output as a JSON
+    line as soon as it (and, if ordered, every job before it) is done;
+    returns the number of jobs run"""
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = (pool.imap if ordered else pool.imap_unordered)(
+            simulate, jobs, chunksize)
+        count = 0
+        for result in results:
+            output.write(json.dumps(result, sort_keys=True) + '\n')
+            count += 1
+    finally:
+        pool.close()
+        pool.join()
+    output.flush()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('files', nargs='*',
+                        help='JSON lines job files; defaults to stdin')
+    parser.add_argument('--width', type=float, default=800,
+                        help='board width for jobs that don\'t give one')
+    parser.add_argument('--height', type=float, default=600,
+                        help='board height for jobs that don\'t give one')
+    parser.add_argument('--ticks', type=int, default=DEFAULT_TICKS,
+                        help='ticks for jobs that don\'t give their own')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes; defaults to all cores')
+    parser.add_argument('--chunksize', type=int, default=32,
+                        help='jobs handed to a worker at a time')
+    parser.add_argument('--unordered', action='store_true',
+                        help='write results as they finish, in any order')
+    args = parser.parse_args(argv)
+
+    jobs = read_jobs(fileinput.input(args.files or ['-']), args.width,
+                     args.height, args.ticks)
+    run(jobs, sys.stdout, args.processes, args.chunksize, not args.unordered)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
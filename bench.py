@@ -0,0 +1,290 @@
+"""benchmarks for the physics hot path
+
+Macro benchmarks load every level onto a headless simulation, fire a
+scripted set of shots and time each tick. With --shots, each level gets
+one run with that many shots flung at once instead, to stress the
+simulation the way the numpy one is meant for. Micro benchmarks time the
+collision and gravity helpers on their own. Results are written as JSON so
+two runs can be compared:
+
+    python bench.py --output before.json
+    python bench.py --output after.json --compare before.json
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+
+import physics
+from levels import levels
+from profiling import percentile
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+BOARD_SIZE = (800, 600)
+
+# (start, end) drags relative to the board size, from a range of spots and
+# angles so that shots hit goal points, black holes and walls
+SCRIPTED_FLINGS = [
+    ((.1, .5), (.05, .5)),
+    ((.5, .1), (.5, .02)),
+    ((.2, .8), (.15, .9)),
+    ((.9, .5), (.97, .52)),
+    ((.5, .9), (.45, .98)),
+    ((.3, .3), (.2, .25)),
+    ((.7, .2), (.75, .1)),
+    ((.6, .7), (.65, .8)),
+]
+
+
+def make_simulation(vectorized=False):
+    if vectorized:
+        from vectorized import VectorizedSimulation
+        return VectorizedSimulation(*BOARD_SIZE)
+    return physics.Simulation(*BOARD_SIZE)
+
+
+def scripted_runs(level, vectorized=False, shots=None):
+    """yield a freshly loaded simulation per scripted fling, with the shot
+    already fired, or if shots is given a single one with that many shots
+    fired from random spots on the board"""
+    width, height = BOARD_SIZE
+    if shots:
+        simulation = make_simulation(vectorized)
+        level.load(simulation)
+        rand = random.Random(0)
+        for i in range(shots):
+            simulation.fling(
+                (rand.uniform(.1, .9) * width, rand.uniform(.1, .9) * height),
+                (rand.uniform(.1, .9) * width, rand.uniform(.1, .9) * height))
+        yield simulation
+        return
+
+    for start, end in SCRIPTED_FLINGS:
+        simulation = make_simulation(vectorized)
+        level.load(simulation)
+        simulation.fling((start[0] * width, start[1] * height),
+                         (end[0] * width, end[1] * height))
+        yield simulation
+
+
+def bench_level(level, ticks, vectorized=False, shots=None):
+    timer = timeit.default_timer
+    tick_times = []
+    live_shots = 0
+    for simulation in scripted_runs(level, vectorized, shots):
+        step = simulation.step
+        for i in range(ticks):
+            live_shots += len(simulation.shots)
+            started = timer()
+            step()
+            tick_times.append(timer() - started)
+
+    tick_times.sort()
+    total = sum(tick_times)
+    result = {
+        'ticks': len(tick_times),
+        'ticks_per_second': len(tick_times) / total if total else None,
+        'p50_us': percentile(tick_times, .5) * 1e6,
+        'p90_us': percentile(tick_times, .9) * 1e6,
+        'p99_us': percentile(tick_times, .99) * 1e6,
+        'max_us': tick_times[-1] * 1e6,
+        'mean_shots': live_shots / float(len(tick_times)),
+    }
+    result.update(measure_allocations(level, ticks, vectorized, shots))
+    return result
+
+
+def measure_allocations(level, ticks, vectorized=False, shots=None):
+    """
+    what a tick allocates and keeps: alloc_bytes_per_tick is the tick's
+    peak traced memory over what was allocated going in, or None where
+    tracemalloc can't reset its peak (before python 3.9), and
+    retained_objects_per_tick is how many more objects the garbage
+    collector knows of after the ticks than before, with collection off
+    so that garbage cycles count too. Temporaries are freed as soon as
+    they're done with, so they are only in the bytes
+    """
+    objects = 0
+    count = 0
+    gc.collect()
+    gc.disable()
+    try:
+        for simulation in scripted_runs(level, vectorized, shots):
+            before = len(gc.get_objects())
+            for i in range(ticks):
+                simulation.step()
+            objects += len(gc.get_objects()) - before
+            count += ticks
+    finally:
+        gc.enable()
+    result = {'alloc_bytes_per_tick': None,
+              'retained_objects_per_tick': objects / float(count)}
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        return result
+
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for simulation in scripted_runs(level, vectorized, shots):
+            for i in range(ticks):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                simulation.step()
+                allocated += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    result['alloc_bytes_per_tick'] = allocated / float(count)
+    return result
+
+
+def micro_benchmarks(number):
+    shot = physics.Shot(pos=(100, 100), velocity=(3, 1))
+    other_shot = physics.Shot(pos=(112, 104), velocity=(-2, 1))
+    black_hole = physics.BlackHole(pos=(300, 200))
+    wall = physics.Wall(start_point=(105, 50), end_point=(105, 150))
+    far_wall = physics.Wall(start_point=(600, 50), end_point=(600, 150))
+
+    def collide_wall(wall):
+        def run():
+            shot.last_bounced_wall = None
+            shot.pos = (100, 100)
+            shot.collide_wall(wall)
+        return run
+
+    cases = [
+        ('Body.collide_point', lambda: black_hole.collide_point(310, 205)),
+        ('circles_collide',
+         lambda: physics.circles_collide(shot, other_shot)),
+        ('shots_collide',
+         lambda: physics.shots_collide(shot, other_shot)),
+        ('Shot.gravitate_towards',
+         lambda: shot.gravitate_towards(black_hole)),
+        ('Shot.collide_wall (touching)', collide_wall(wall)),
+        ('Shot.collide_wall (far away)', collide_wall(far_wall)),
+    ]
+
+    results = {}
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        results[name] = {'ns_per_call': best / number * 1e9}
+        results[name].update(measure_call_allocations(func))
+    return results
+
+
+def measure_call_allocations(func, calls=100):
+    """what a call allocates and keeps, measured the same way as
+    measure_allocations measures a tick"""
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        for i in range(calls):
+            func()
+        objects = len(gc.get_objects()) - before
+    finally:
+        gc.enable()
+    result = {'alloc_bytes_per_call': None,
+              'retained_objects_per_call': objects / float(calls)}
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        return result
+
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for i in range(calls):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    result['alloc_bytes_per_call'] = allocated / float(calls)
+    return result
+
+
+def compare(results, baseline):
+    """print the change in every timing between baseline and results"""
+    for section in ('levels', 'micro'):
+        for name, values in sorted(results[section].items()):
+            old_values = baseline.get(section, {}).get(name)
+            if not old_values:
+                continue
+            for key, value in sorted(values.items()):
+                old = old_values.get(key)
+                if not old or value is None or key == 'ticks':
+                    continue
+                print("%-32s %-22s %12.2f -> %12.2f (%+.1f%%)" % (
+                    name, key, old, value, (value - old) * 100. / old))
+
+
+def format_bytes(allocated):
+    """allocated bytes for the tables, which tracemalloc can't always
+    count"""
+    if allocated is None:
+        return 'n/a'
+    return '%.0f' % allocated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ticks', type=int, default=300,
+                        help='ticks to run after each scripted fling')
+    parser.add_argument('--number', type=int, default=20000,
+                        help='calls per micro benchmark repeat')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='use the numpy simulation')
+    parser.add_argument('--shots', type=int,
+                        help='fling this many shots at once per level '
+                        'instead of the scripted flings')
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    args = parser.parse_args(argv)
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'vectorized': args.vectorized,
+        'shots': args.shots,
+        'levels': {},
+        'micro': {},
+    }
+    for level in levels:
+        result = bench_level(level, args.ticks, args.vectorized, args.shots)
+        results['levels'][level.__name__] = result
+        print("%-12s %6.1f shots %9.0f ticks/s  p50 %7.1fus  p99 %7.1fus  "
+              "%8s bytes/tick  %+7.2f retained/tick" % (
+                  level.__name__, result['mean_shots'],
+                  result['ticks_per_second'], result['p50_us'],
+                  result['p99_us'],
+                  format_bytes(result['alloc_bytes_per_tick']),
+                  result['retained_objects_per_tick']))
+
+    results['micro'] = micro_benchmarks(args.number)
+    for name, result in sorted(results['micro'].items()):
+        print("%-32s %8.0f ns %8s bytes" % (
+            name, result['ns_per_call'],
+            format_bytes(result['alloc_bytes_per_call'])))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+"""uniform grid broad phase for finding circles that might be touching
+
+Bodies are bucketed by the grid cells their bounding boxes cover, so only
+bodies sharing a cell ever get handed to the exact circle test.
+
+Run this module directly to check that the grid finds exactly the same
+colliding pairs as testing every pair against every other.
+"""
+
+import itertools
+import math
+
+
+class SpatialGrid(object):
+    def __init__(self, cell_size=20.):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.bodies = []
+
+    def cell_range(self, x, y, r):
+        size = self.cell_size
+        return (int(math.floor((x - r) / size)),
+                int(math.floor((x + r) / size)),
+                int(math.floor((y - r) / size)),
+                int(math.floor((y + r) / size)))
+
+    def clear(self):
+        self.cells = {}
+        self.bodies = []
+
+    def insert(self, body):
+        """add a body to the grid; returns its index"""
+        index = len(self.bodies)
+        self.bodies.append(body)
+        min_x, max_x, min_y, max_y = self.cell_range(body.x, body.y, body.r)
+        cells = self.cells
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                cell = (cell_x, cell_y)
+                if cell in cells:
+                    cells[cell].append(index)
+                else:
+                    cells[cell] = [index]
+        return index
+
+    def pairs(self):
+        """sorted (i, j) index pairs, i < j, of bodies sharing a cell"""
+        pairs = set()
+        for cell in self.cells.values():
+            if len(cell) > 1:
+                pairs.update(itertools.combinations(cell, 2))
+        return sorted(pairs)
+
+    def query(self, x, y, r):
+        """sorted indices of bodies sharing a cell with the given circle"""
+        min_x, max_x, min_y, max_y = self.cell_range(x, y, r)
+        cells = self.cells
+        found = set()
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                found.update(cells.get((cell_x, cell_y), ()))
+        return sorted(found)
+
+    def rebuild(self, bodies):
+        """clear the grid and insert bodies, sizing cells to fit the
+        largest one"""
+        self.clear()
+        if bodies:
+            self.cell_size = max(2. * body.r for body in bodies) or 1.
+        for body in bodies:
+            self.insert(body)
+
+
+def check(trials=200, seed=0):
+    """compare the grid with brute force over random boards"""
+    import random
+
+    from physics import GoalPoint, Shot, circles_collide
+
+    rand = random.Random(seed)
+    for trial in range(trials):
+        shots = [Shot(pos=(rand.uniform(0, 400), rand.uniform(0, 300)),
+                      r=rand.uniform(2, 20))
+                 for i in range(rand.randint(0, 80))]
+        goal_points = [GoalPoint(pos=(rand.uniform(0, 400),
+                                      rand.uniform(0, 300)))
+                       for i in range(rand.randint(0, 80))]
+
+        grid = SpatialGrid()
+        grid.rebuild(shots)
+
+        grid_pairs = [(i, j) for i, j in grid.pairs()
+                      if circles_collide(shots[i], shots[j])]
+        brute_pairs = [(i, j) for i, j in
+                       itertools.combinations(range(len(shots)), 2)
+                       if circles_collide(shots[i], shots[j])]
+        assert grid_pairs == brute_pairs, (trial, grid_pairs, brute_pairs)
+
+        for goal_point in goal_points:
+            grid_hits = [i for i in grid.query(goal_point.x, goal_point.y,
+                                               goal_point.r)
+                         if circles_collide(goal_point, shots[i])]
+            brute_hits = [i for i, shot in enumerate(shots)
+                          if circles_collide(goal_point, shot)]
+            assert grid_hits == brute_hits, (trial, grid_hits, brute_hits)
+
+
+if __name__ == '__main__':
+    check()
+    print("broad phase agrees with brute force")
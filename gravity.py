@@ -0,0 +1,283 @@
+"""gravity engines for boards with a lot of attractors
+
+A simulation pulls every shot towards every black hole, which is fine for
+a couple of black holes but grows with shots times attractors, and
+quadratically once shots pull on each other too. A gravity engine set as
+Simulation.gravity does that pulling instead:
+
+ExactGravity sums every pair with the same formula as
+Shot.gravitate_towards. BarnesHutGravity puts the attractors in a quadtree
+and lets a far away cell pull as one body at its center of mass, trading
+accuracy for speed through the opening angle theta: a cell is used as a
+whole when its size over its distance is below theta, so 0 is exact and
+bigger is faster and rougher. Comparing the two:
+
+    python gravity.py --sources 10,100,1000 --thetas .3,.5,.8
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import timeit
+
+# quadtree cells aren't split past this depth, so bodies on top of each
+# other share a leaf instead of splitting forever
+MAX_DEPTH = 16
+
+# bodies a leaf holds before it's split; summing a few bodies directly is
+# cheaper than walking down to them one cell at a time
+LEAF_SIZE = 8
+
+
+class ExactGravity(object):
+    """pull each shot towards every attractor (and, if shots_attract, every
+    other shot) one pair at a time"""
+
+    def __init__(self, shots_attract=False):
+        self.shots_attract = shots_attract
+
+    def pull(self, shots, attractors, dt=1.):
+        # pulls only depend on positions, so velocities can be changed as
+        # they're worked out without the order of the shots mattering
+        sources = list(attractors)
+        if self.shots_attract:
+            sources.extend(shots)
+        for shot in shots:
+            x = shot.x
+            y = shot.y
+            for source in sources:
+                gravity_x = source.x - x
+                gravity_y = source.y - y
+                length2 = gravity_x ** 2 + gravity_y ** 2
+                if not length2:
+                    continue
+                shot.velocity_x += (gravity_x * 1. / length2) * \
+                    source.mass * dt
+                shot.velocity_y += (gravity_y * 1. / length2) * \
+                    source.mass * dt
+
+
+class QuadTree(object):
+    """a cell of the Barnes-Hut tree; leaves hold bodies, other cells hold
+    four children, and every cell knows its total mass and where the
+    center of that mass is"""
+
+    def __init__(self, center_x, center_y, half_size, depth=0):
+        self.center_x = center_x
+        self.center_y = center_y
+        self.half_size = half_size
+        self.depth = depth
+        self.bodies = []
+        self.children = None
+        self.mass = 0.
+        self.mass_x = 0.
+        self.mass_y = 0.
+
+    def child_for(self, x, y):
+        return self.children[(x >= self.center_x) + 2 * (y >= self.center_y)]
+
+    def finish(self):
+        """work out centers of mass, from the leaves up, and return the
+        cell as nested tuples of (center of mass x, y, mass, size squared,
+        children, bodies as (x, y, mass)) that are quicker to walk"""
+        children = ()
+        if self.children:
+            children = tuple(child.finish() for child in self.children
+                             if child.mass)
+        mass = self.mass
+        if mass:
+            self.mass_x /= mass
+            self.mass_y /= mass
+        return (self.mass_x, self.mass_y, mass, (2 * self.half_size) ** 2,
+                children,
+                tuple((body.x, body.y, body.mass) for body in self.bodies))
+
+    def insert(self, body):
+        mass = body.mass
+        self.mass += mass
+        self.mass_x += body.x * mass
+        self.mass_y += body.y * mass
+        if self.children:
+            self.child_for(body.x, body.y).insert(body)
+            return
+        self.bodies.append(body)
+        if len(self.bodies) > LEAF_SIZE and self.depth < MAX_DEPTH:
+            self.split()
+
+    def split(self):
+        quarter = self.half_size / 2.
+        self.children = [
+            QuadTree(self.center_x + dx * quarter,
+                     self.center_y + dy * quarter, quarter, self.depth + 1)
+            for dy in (-1, 1) for dx in (-1, 1)]
+        bodies = self.bodies
+        self.bodies = []
+        for body in bodies:
+            self.child_for(body.x, body.y).insert(body)
+
+
+def build_tree(bodies):
+    """the tuples of a finished quadtree holding bodies, or None if there
+    are none"""
+    bodies = [body for body in bodies if body.mass]
+    if not bodies:
+        return None
+    min_x = min(body.x for body in bodies)
+    max_x = max(body.x for body in bodies)
+    min_y = min(body.y for body in bodies)
+    max_y = max(body.y for body in bodies)
+    half_size = max(max_x - min_x, max_y - min_y, 1.) / 2. * 1.001
+    tree = QuadTree((min_x + max_x) / 2., (min_y + max_y) / 2., half_size)
+    for body in bodies:
+        tree.insert(body)
+    return tree.finish()
+
+
+class BarnesHutGravity(object):
+    """approximate the pull of far away groups of attractors by their
+    center of mass; see the module docstring for theta"""
+
+    def __init__(self, theta=.5, shots_attract=False):
+        self.theta = theta
+        self.shots_attract = shots_attract
+
+    def pull(self, shots, attractors, dt=1.):
+        sources = list(attractors)
+        if self.shots_attract:
+            sources.extend(shots)
+        tree = build_tree(sources)
+        if tree is None:
+            return
+
+        theta2 = self.theta ** 2
+        for shot in shots:
+            x = shot.x
+            y = shot.y
+            pull_x = 0.
+            pull_y = 0.
+            stack = [tree]
+            pop = stack.pop
+            extend = stack.extend
+            while stack:
+                mass_x, mass_y, mass, size2, children, bodies = pop()
+                if children:
+                    gravity_x = mass_x - x
+                    gravity_y = mass_y - y
+                    length2 = gravity_x * gravity_x + gravity_y * gravity_y
+                    if size2 < theta2 * length2:
+                        pull_x += gravity_x / length2 * mass
+                        pull_y += gravity_y / length2 * mass
+                    else:
+                        extend(children)
+                    continue
+                for body_x, body_y, body_mass in bodies:
+                    gravity_x = body_x - x
+                    gravity_y = body_y - y
+                    length2 = gravity_x * gravity_x + gravity_y * gravity_y
+                    if length2:
+                        pull_x += gravity_x / length2 * body_mass
+                        pull_y += gravity_y / length2 * body_mass
+            shot.velocity_x += pull_x * dt
+            shot.velocity_y += pull_y * dt
+
+
+class _Body(object):
+    def __init__(self, x, y, mass):
+        self.x = x
+        self.y = y
+        self.mass = mass
+        self.velocity_x = 0.
+        self.velocity_y = 0.
+
+
+def random_board(sources, shots, seed=0, width=800, height=600):
+    """(shots, attractors) scattered over a board"""
+    rand = random.Random(seed)
+    attractors = [_Body(rand.uniform(0, width), rand.uniform(0, height),
+                        rand.uniform(10, 50)) for i in range(sources)]
+    shot_bodies = [_Body(rand.uniform(0, width), rand.uniform(0, height), 1.)
+                   for i in range(shots)]
+    return shot_bodies, attractors
+
+
+def measure(engine, sources, shots, number):
+    """(seconds per pull, list of the pulls) for engine on a random
+    board"""
+    shot_bodies, attractors = random_board(sources, shots)
+
+    def run():
+        for shot in shot_bodies:
+            shot.velocity_x = shot.velocity_y = 0.
+        engine.pull(shot_bodies, attractors)
+
+    seconds = min(timeit.repeat(run, number=number, repeat=3)) / number
+    run()
+    return seconds, [(shot.velocity_x, shot.velocity_y)
+                     for shot in shot_bodies]
+
+
+def report(source_counts, thetas, shots, number):
+    """accuracy and speed of Barnes-Hut at each theta against the exact
+    sum, for boards with each number of attractors"""
+    results = []
+    for sources in source_counts:
+        exact_time, exact_pulls = measure(ExactGravity(), sources, shots,
+                                          number)
+        for theta in thetas:
+            time, pulls = measure(BarnesHutGravity(theta), sources, shots,
+                                  number)
+            errors = []
+            for (x, y), (exact_x, exact_y) in zip(pulls, exact_pulls):
+                exact_length = math.hypot(exact_x, exact_y)
+                if exact_length:
+                    errors.append(math.hypot(x - exact_x, y - exact_y) /
+                                  exact_length)
+            errors.sort()
+            results.append({
+                'sources': sources,
+                'theta': theta,
+                'exact_us': exact_time * 1e6,
+                'barnes_hut_us': time * 1e6,
+                'speedup': exact_time / time,
+                'mean_error': sum(errors) / len(errors),
+                'p99_error': errors[min(len(errors) - 1,
+                                        int(len(errors) * .99))],
+                'max_error': errors[-1],
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sources', default='10,50,200,1000',
+                        help='comma separated numbers of attractors')
+    parser.add_argument('--thetas', default='.3,.5,.8,1',
+                        help='comma separated opening angles to try')
+    parser.add_argument('--shots', type=int, default=100,
+                        help='shots pulled on each board')
+    parser.add_argument('--number', type=int, default=3,
+                        help='pulls per timing repeat')
+    parser.add_argument('--output', help='write results as JSON here')
+    args = parser.parse_args(argv)
+
+    results = report([int(n) for n in args.sources.split(',')],
+                     [float(theta) for theta in args.thetas.split(',')],
+                     args.shots, args.number)
+    print("%7s %5s %10s %10s %7s %10s %10s %10s" % (
+        'sources', 'theta', 'exact us', 'b-h us', 'speedup', 'mean err',
+        'p99 err', 'max err'))
+    for result in results:
+        print("%(sources)7d %(theta)5.2f %(exact_us)10.0f "
+              "%(barnes_hut_us)10.0f %(speedup)6.1fx %(mean_error)10.2e "
+              "%(p99_error)10.2e %(max_error)10.2e" % result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,226 @@
+"""levels described in data files instead of python
+
+A level file is JSON. Positions and lengths are either plain numbers of
+pixels or strings relative to the board: "40%" is 40% of the board's width
+for x values and of its height for y values, "40%w" and "40%h" pick the
+dimension explicitly, and either can be followed by "+ 10" or "- 10"
+pixels. For example, levelpack/swingers.json is:
+
+    {
+        "name": "swingers",
+        "max_shots": 1,
+        "walls": [
+            {"start_point": ["70% + 10", "60%"],
+             "end_point": ["70% + 10", "40%"], "thickness": 4}
+        ],
+        "black_holes": [
+            {"pos": ["50%", "50%"], "mass": 50}
+        ],
+        "goal_points": [
+            {"pos": ["40%", "70%"], "velocity": [0, -1],
+             "flip_every": "40%h"},
+            {"path": [["20%", "20%"], ["80%", "20%"], ["50%", "80%"]],
+             "speed": 2},
+            {"pos": ["50%", "30%"], "amplitude": [100, 0], "period": 240}
+        ]
+    }
+
+Goal points can follow one of the motion scripts in motion.py: with
+flip_every they reverse their velocity every that many ticks, with a path
+they go round it at speed (or stop at its end if "loop" is false), and
+with an amplitude and period they swing back and forth around pos.
+
+A directory of level files gets a compiled binary index (index.bin) with
+each level's name and max_shots, so a level pack can be listed without
+opening its files. A file is only parsed when its level is loaded. The
+index is rebuilt whenever a level file is added, removed or changed, or
+by hand with
+
+    python levelfile.py levelpack
+"""
+
+import json
+import os
+import re
+import struct
+import sys
+
+from motion import Oscillator, PingPong, Waypoints
+from physics import BlackHole, GoalPoint, Wall
+
+INDEX_FILE = 'index.bin'
+INDEX_MAGIC = b'FLIX'
+INDEX_VERSION = 1
+
+INDEX_HEADER = struct.Struct('<4sBdI')
+INDEX_ENTRY = struct.Struct('<HHH')
+
+VALUE_RE = re.compile(r'^\s*(-?[\d.]+)%([wh]?)\s*(?:([+-])\s*([\d.]+))?\s*$')
+
+
+def resolve(value, axis, width, height):
+    """pixels for a level file value; axis is 'w' or 'h' and is used when
+    the value doesn't say which dimension it is relative to"""
+    if isinstance(value, (int, float)):
+        return value
+    match = VALUE_RE.match(value)
+    if not match:
+        raise ValueError("can't make sense of %r in a level file" % value)
+    percent, dimension, sign, offset = match.groups()
+    size = width if (dimension or axis) == 'w' else height
+    pixels = float(percent) / 100. * size
+    if offset:
+        pixels += float(offset) if sign == '+' else -float(offset)
+    return pixels
+
+
+def resolve_point(point, width, height):
+    return (resolve(point[0], 'w', width, height),
+            resolve(point[1], 'h', width, height))
+
+
+def motion(spec, width, height):
+    """the motion script a goal point spec asks for, or None"""
+    if 'flip_every' in spec:
+        return PingPong(resolve_point(spec['pos'], width, height),
+                        spec['velocity'],
+                        resolve(spec['flip_every'], 'h', width, height))
+    if 'path' in spec:
+        return Waypoints([resolve_point(point, width, height)
+                          for point in spec['path']],
+                         spec['speed'], spec.get('loop', True))
+    if 'amplitude' in spec:
+        return Oscillator(resolve_point(spec['pos'], width, height),
+                          resolve_point(spec['amplitude'], width, height),
+                          spec['period'], spec.get('phase', 0.))
+    return None
+
+
+class LevelFile(object):
+    """
+    A level backed by a file. It has the same name, max_shots and load()
+    as the level classes in levels.py, so it can go anywhere they can.
+    """
+
+    def __init__(self, path, name=None, max_shots=None):
+        self.path = path
+        self.__name__ = os.path.splitext(os.path.basename(path))[0]
+        self.data = None
+        if name is None or max_shots is None:
+            self.parse()
+        else:
+            self.name = name
+            self.max_shots = max_shots
+
+    def load(self, fling_board):
+        data = self.data or self.parse()
+        width = fling_board.width
+        height = fling_board.height
+
+        for spec in data.get('black_holes', ()):
+            fling_board.add_black_hole(BlackHole(
+                pos=resolve_point(spec['pos'], width, height),
+                r=spec.get('r'), mass=spec.get('mass')))
+
+        for spec in data.get('walls', ()):
+            fling_board.add_wall(Wall(
+                start_point=resolve_point(spec['start_point'], width, height),
+                end_point=resolve_point(spec['end_point'], width, height),
+                thickness=spec.get('thickness', 4.)))
+
+        for spec in data.get('goal_points', ()):
+            fling_board.add_goal_point(GoalPoint(
+                pos=resolve_point(spec.get('pos', (0, 0)), width, height),
+                velocity=spec.get('velocity', (0, 0)), r=spec.get('r'),
+                motion=motion(spec, width, height)))
+
+    def parse(self):
+        with open(self.path) as f:
+            self.data = json.load(f)
+        self.name = self.data.get('name', self.__name__)
+        self.max_shots = self.data.get('max_shots', 1)
+        return self.data
+
+
+def level_paths(directory):
+    return sorted(os.path.join(directory, filename)
+                  for filename in os.listdir(directory)
+                  if filename.endswith('.json'))
+
+
+def newest_mtime(paths):
+    return max([os.stat(path).st_mtime for path in paths] or [0.])
+
+
+def build_index(directory):
+    """parse every level file in directory and write its index; returns
+    the LevelFiles"""
+    paths = level_paths(directory)
+    level_files = [LevelFile(path) for path in paths]
+    entries = []
+    for level_file in level_files:
+        name = level_file.name.encode('utf-8')
+        filename = os.path.basename(level_file.path).encode('utf-8')
+        entries.append(INDEX_ENTRY.pack(level_file.max_shots, len(name),
+                                        len(filename)) + name + filename)
+
+    header = INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION,
+                               newest_mtime(paths), len(entries))
+    try:
+        with open(os.path.join(directory, INDEX_FILE), 'wb') as f:
+            f.write(header + b''.join(entries))
+    except (IOError, OSError):
+        # a read-only pack still works, it just gets parsed every start
+        pass
+    return level_files
+
+
+def read_index(directory):
+    """LevelFiles listed in directory's index, or None if the index is
+    missing or out of date"""
+    try:
+        with open(os.path.join(directory, INDEX_FILE), 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+
+    if len(data) < INDEX_HEADER.size:
+        return None
+    paths = level_paths(directory)
+    magic, version, mtime, count = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION or \
+       count != len(paths) or mtime != newest_mtime(paths):
+        return None
+
+    level_files = []
+    offset = INDEX_HEADER.size
+    for i in range(count):
+        max_shots, name_length, filename_length = \
+            INDEX_ENTRY.unpack_from(data, offset)
+        offset += INDEX_ENTRY.size
+        name = data[offset:offset + name_length].decode('utf-8')
+        offset += name_length
+        filename = data[offset:offset + filename_length].decode('utf-8')
+        offset += filename_length
+        path = os.path.join(directory, filename)
+        if path not in paths:
+            return None
+        level_files.append(LevelFile(path, name=name, max_shots=max_shots))
+    return level_files
+
+
+def load_pack(directory):
+    """LevelFiles for every level in directory, using its index when it's
+    up to date and rebuilding it when it isn't"""
+    if not os.path.isdir(directory):
+        return []
+    level_files = read_index(directory)
+    if level_files is None:
+        level_files = build_index(directory)
+    return level_files
+
+
+if __name__ == '__main__':
+    for directory in sys.argv[1:]:
+        level_files = build_index(directory)
+        print("indexed %s levels in %s" % (len(level_files), directory))
@@ -1,9 +1,14 @@
 """module that holds all the levels"""
 
-from kivy.clock import Clock
-from kivy.vector import Vector
+import os
 
-from widgets import AimLine, BlackHole, GoalPoint, Shot, Stars, Wall
+from levelfile import load_pack
+from motion import PingPong
+from physics import BlackHole, GoalPoint, Wall, rotate
+
+# level files in here are played after the built in levels
+LEVEL_PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'levelpack')
 
 
 class First(object):
@@ -49,22 +54,13 @@ class TwoTimed(object):
         bottom_height = fling_board.height * .3
         left_x = fling_board.width * .4
         right_x = fling_board.width * .6
-        seconds_til_switch = (top_height - bottom_height) / 60.
+        ticks_til_switch = top_height - bottom_height
 
         for start_x in (left_x, right_x):
-            goal_point = GoalPoint(pos=(start_x, top_height),
-                                   velocity_y=-1)
-            Clock.schedule_interval(self.change_direction(goal_point),
-                                    seconds_til_switch)
+            goal_point = GoalPoint(motion=PingPong(
+                (start_x, top_height), (0, -1), ticks_til_switch))
             fling_board.add_goal_point(goal_point)
 
-    @classmethod
-    def change_direction(self, goal_point):
-        def change_func(dt):
-            goal_point.velocity_y *= -1
-
-        return change_func
-
 
 class TwoTimedTwo(object):
     name = "two, timed: part II"
@@ -76,26 +72,17 @@ class TwoTimedTwo(object):
         bottom_height = fling_board.height * .3
         left_x = fling_board.width * .4
         right_x = fling_board.width * .6
-        seconds_til_switch = (top_height - bottom_height) / 60.
+        ticks_til_switch = top_height - bottom_height
 
         start_pos_vels = [
             (left_x, top_height, -1),
             (right_x, bottom_height, 1)]
 
         for start_x, start_y, start_velocity_y in start_pos_vels:
-            goal_point = GoalPoint(pos=(start_x, start_y),
-                                   velocity_y=start_velocity_y)
-            Clock.schedule_interval(self.change_direction(goal_point),
-                                    seconds_til_switch)
+            goal_point = GoalPoint(motion=PingPong(
+                (start_x, start_y), (0, start_velocity_y), ticks_til_switch))
             fling_board.add_goal_point(goal_point)
 
-    @classmethod
-    def change_direction(self, goal_point):
-        def change_func(dt):
-            goal_point.velocity_y *= -1
-
-        return change_func
-
 
 class OrbitIt(object):
     name = "orbit it"
@@ -111,12 +98,12 @@ class OrbitIt(object):
         black_hole = BlackHole(pos=(center_x, center_y))
         fling_board.add_black_hole(black_hole)
 
-        v = Vector(r, 0)
+        v = (r, 0)
         rotation_angle = 360. / num_points
         for i in range(num_points):
-            goal_point = GoalPoint(pos=(center_x + v.x, center_y + v.y))
+            goal_point = GoalPoint(pos=(center_x + v[0], center_y + v[1]))
             fling_board.add_goal_point(goal_point)
-            v = v.rotate(rotation_angle)
+            v = rotate(v[0], v[1], rotation_angle)
 
 
 class GoFigure(object):
@@ -229,3 +216,7 @@ levels = [
     HopSkip,
     Kinetic,
 ]
+levels.extend(load_pack(LEVEL_PACK_DIR))
+
+# position of each level in levels, so finding it doesn't mean a search
+level_numbers = dict((level, number) for number, level in enumerate(levels))
@@ -1,27 +1,48 @@
 #!/usr/bin/env python
 import itertools
-import math
+import sys
+
+from profiling import StartupTimer, TickProfiler
+
+# how long each part of starting up takes, shown when startup_report is on
+startup = StartupTimer()
+
+if __name__ == '__main__' and sys.argv[1:2] == ['batch']:
+    # headless batch simulation; this has to happen before kivy is
+    # imported, since that opens a window
+    import batch
+    batch.main(sys.argv[2:])
+    sys.exit()
 
 import kivy
 from kivy.animation import Animation
 from kivy.app import App
 from kivy.clock import Clock
 from kivy.core.window import Window
-from kivy.config import Config
-from kivy.lang import Builder
-from kivy.vector import Vector
-from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.label import Label
 from kivy.uix.widget import Widget
 
-from widgets import (AimLine, BlackHole, GoalPoint, MainMenu, Shot,
-                     ShotCounter, Stars)
-from levels import levels
+startup.mark('kivy imports')
+
+# only what the main menu needs is imported up front; levels and the
+# optional features (numpy, gravity engines, replays, the batch renderer)
+# are imported when they're first used
+import physics
+import widgets
+from pool import WidgetPool
+from scope import LevelScope, live_objects, resident_memory
+from widgets import AimLine, MainMenu, ProfilerOverlay, ShotCounter, Stars
+
+startup.mark('flingy imports')
 
 kivy.require('1.0.9')
 
-# set a limit on the number of shots allowed on screen at once
-MAX_SHOTS = 20
+# longest frame the physics will catch up on; anything longer is a hitch
+# and the time is dropped instead of simulated
+MAX_FRAME_TIME = .25
+
+# frames between refreshes of the profiler overlay
+PROFILER_OVERLAY_FRAMES = 30
 
 
 class FlingBoard(Widget):
@@ -29,31 +50,68 @@ class FlingBoard(Widget):
     Main application widget, takes all the touches and turns them into
     fun.
     """
-    def __init__(self, *args, **kwargs):
+    def __init__(self, simulation=None, physics_rate=60, substeps=1,
+                 batched_rendering=False, recorder=None, preview_ticks=0,
+                 session=None, *args, **kwargs):
         super(FlingBoard, self).__init__()
         Window.clearcolor = (0.1, 0.1, 0.1, 1.)
-        Clock.schedule_interval(self.tick, 1 / 60.)
         self._keyboard = Window.request_keyboard(
             None, self)
         self._keyboard.bind(on_key_down=self._on_keyboard_down)
-        self.aim_line = None
-        self.black_holes = []
+        self.accumulator = 0.
+        # touch uid -> the AimLine of every shot being aimed
+        self.aim_lines = {}
+        self.body_widgets = {}
         self.buttons = []
         self.current_level = None
         self.level_label = None
-        self.goal_points = []
+        self.menu = None
+        self.physics_rate = physics_rate
+        # True while a level is being played, so input can wake the tick
+        self.playing = False
+        self.predictor = None
+        self.previous_positions = {}
+        self.profiled_frames = 0
+        self.profiler_overlay = None
+        self.recorder = recorder
+        # shots flung since the last frame, which get their widgets all at
+        # once at the start of the next one
+        self.released_shots = []
+        self.renderer = None
+        if batched_rendering:
+            from renderer import BodyRenderer
+            self.renderer = BodyRenderer()
+        # owns the widgets, clock events and animations of whatever is on
+        # screen, so they all go with it
+        self.scope = LevelScope(self)
+        # a netplay.Host to take flings from and send snapshots to
+        self.session = session
         self.shot_counter = None
-        self.shots = []
+        self.simulation = simulation or physics.Simulation()
         self.stars = None
-        self.walls = []
-
-        self.new_background()
+        self.substeps = substeps
+        # physics runs in fixed steps of 1 / physics_rate seconds, each
+        # split into substeps; tick runs every frame, but only while a
+        # level is being played and something on it is moving
+        self.ticking = False
+        # widgets are taken from and given back to these instead of being
+        # built for every body
+        self.widget_pools = dict(
+            (widget_class, WidgetPool(widget_class)) for widget_class in (
+                widgets.BlackHole, widgets.GoalPoint, widgets.Shot,
+                widgets.Wall))
+        if preview_ticks:
+            from preview import TrajectoryPredictor
+            self.predictor = TrajectoryPredictor(self.simulation,
+                                                 ticks=preview_ticks)
+        self.simulation.on_complete = self.complete_level
 
         # schedule rather than call directly init, so that width and
         # height are finished initializing
         Clock.schedule_once(self.display_main_menu)
 
     def _on_keyboard_down(self, keyboard, keycode, text, modifiers):
+        from levels import levels
         try:
             level_index = int(text)
             if level_index < len(levels):
@@ -62,52 +120,87 @@ class FlingBoard(Widget):
         except ValueError:
             pass
 
-    def add_aim_line(self, aim_line):
-        self.aim_line = (aim_line)
-        self.add_widget(aim_line)
+    def add_aim_line(self, touch_id, aim_line):
+        self.aim_lines[touch_id] = aim_line
+        self.scope.add_widget(aim_line)
 
     def add_black_hole(self, black_hole):
-        self.black_holes.append(black_hole)
-        self.add_widget(black_hole)
+        self.simulation.add_black_hole(black_hole)
+        self.add_body_widget(black_hole, widgets.BlackHole)
+
+    def add_body_widget(self, body, widget_class):
+        widget = self.widget_pools[widget_class].acquire(body)
+        self.body_widgets[body] = widget
+        self.add_widget(widget)
 
     def add_goal_point(self, goal_point):
-        self.goal_points.append(goal_point)
-        self.add_widget(goal_point)
+        self.simulation.add_goal_point(goal_point)
+        if not self.renderer:
+            self.add_body_widget(goal_point, widgets.GoalPoint)
+        if goal_point.moving(self.simulation.elapsed):
+            self.wake()
+
+    def add_released_shots(self):
+        """give the shots flung since the last frame their widgets; shots
+        that were evicted or eaten before then never get one"""
+        shots = self.simulation.shots
+        for shot in self.released_shots:
+            if shot in shots:
+                self.add_shot_widget(shot)
+        self.released_shots = []
 
     def add_shot(self, shot):
-        self.shots.append(shot)
-        self.add_widget(shot)
+        self.simulation.add_shot(shot)
+        self.add_shot_widget(shot)
         self.shot_counter.increment()
+        self.wake()
+
+    def add_shot_widget(self, shot):
+        if not self.renderer:
+            self.add_body_widget(shot, widgets.Shot)
 
     def add_shot_counter(self, shot_counter):
         self.shot_counter = shot_counter
-        self.add_widget(shot_counter)
+        self.scope.add_widget(shot_counter)
 
     def add_wall(self, wall):
-        self.walls.append(wall)
-        self.add_widget(wall)
+        self.simulation.add_wall(wall)
+        self.add_body_widget(wall, widgets.Wall)
 
     def clear_level(self):
-        if hasattr(self, 'menu') and self.menu:
-            self.menu.clear_widgets()
+        if self.menu and self.menu.parent:
+            self.remove_widget(self.menu)
+
+        if self.recorder:
+            self.recorder.record_clear(self.simulation.ticks)
+        self.simulation.clear()
+        self.accumulator = 0.
+        self.aim_lines = {}
+        for widget in self.body_widgets.values():
+            self.remove_widget(widget)
+            self.widget_pools[type(widget)].release(widget)
+        self.body_widgets = {}
+        if self.predictor:
+            self.predictor.clear()
+        self.previous_positions = {}
+        self.released_shots = []
+        self.level_label = None
+        self.profiler_overlay = None
+        self.shot_counter = None
+        self.scope.dispose()
 
-        self.black_holes = []
-        self.goal_points = []
-        self.shots = []
-        self.walls = []
-        self.clear_widgets()
-        if self.stars:
-            self.add_widget(self.stars)
+    def complete_level(self):
+        self.scope.schedule_once(self.next_level, 1)
 
     def display_level_text(self, level_text):
         self.level_label = Label(
             text=level_text, font_size=20, width=self.width, halign='center',
             y=self.height - 200, color=(.8, .8, .8, 0.))
-        self.add_widget(self.level_label)
+        self.scope.add_widget(self.level_label)
         anim = Animation(color=(1, 1, 1, 1), duration=2.) + \
             Animation(color=(1, 1, 1, 1), duration=.5) + \
             Animation(color=(1, 1, 1, 0), duration=2.)
-        anim.start(self.level_label)
+        self.scope.animate(anim, self.level_label)
 
     def display_instructions(self, button):
         instructions_text = """ 
@@ -123,21 +216,31 @@ double tap to screen at any time to bring up the menu"""
         instructions_label = Label(
             text=instructions_text, font_size=20, width=self.width * .8,
             x=self.width * .1, y=self.height - 200, color=(.8, .8, .8, 0.))
-        self.add_widget(instructions_label)
+        self.scope.add_widget(instructions_label)
         anim = Animation(color=(.8, 1, 1, 1), duration=2.)
-        anim.start(instructions_label)
+        self.scope.animate(anim, instructions_label)
 
     def display_main_menu(self, *args):
+        self.playing = False
+        self.stop_ticking()
         self.clear_level()
-
-        layout_width = self.width * .2
-        layout_x = self.width * .4
-        layout_y = self.height * .1
-
-        self.menu = MainMenu(self, x=layout_x, y=layout_y, width=layout_width,
-                             current_level=self.current_level)
+        self.pause_session()
+
+        # the menu is built once and moved and updated every time it's
+        # shown
+        if not self.menu:
+            self.menu = MainMenu(self)
+        self.menu.x = self.width * .4
+        self.menu.y = self.height * .1
+        self.menu.width = self.width * .2
+        self.menu.update_buttons(self.current_level)
         self.add_widget(self.menu)
 
+        if not self.stars:
+            startup.mark('main menu')
+            # the stars can wait until the menu is on screen
+            Clock.schedule_once(lambda dt: self.new_background())
+
     def end_game(self, *args):
         end_game_text = """ 
 thanks for playing
@@ -147,37 +250,112 @@ check back soon for more levels and updates"""
         end_game_label = Label(
             text=end_game_text, font_size=20, width=self.width * .8,
             x=self.width * .1, y=self.height - 200, color=(1., 1., 1., 0.))
-        self.add_widget(end_game_label)
+        self.scope.add_widget(end_game_label)
         anim = Animation(color=(.8, 1, 1, 1), duration=2.)
-        anim.start(end_game_label)
+        self.scope.animate(anim, end_game_label)
+        self.playing = False
+        self.stop_ticking()
+        self.pause_session()
+
+    def fling_from_peer(self, touch_id, start_pt, end_pt):
+        """a netplay peer's fling, made as a touch that goes down at
+        start_pt and is dragged to and let go at end_pt"""
+        if self.recorder:
+            from replay import TOUCH_DOWN, TOUCH_MOVE, TOUCH_UP
+            for kind, pos in ((TOUCH_DOWN, start_pt), (TOUCH_MOVE, end_pt),
+                              (TOUCH_UP, end_pt)):
+                self.recorder.record_touch(kind, self.simulation.ticks, pos,
+                                           touch_id)
+        if self.simulation.touch_down(start_pt, touch_id):
+            self.simulation.touch_move(end_pt, touch_id)
+            self.release_touch(end_pt, touch_id)
 
     def load_level(self, level):
+        from levels import level_numbers
         self.clear_level()
-        self.new_background()
+        self.new_background(level_numbers[level] + 1)
+        self.simulation.width = self.width
+        self.simulation.height = self.height
+        if self.recorder:
+            self.recorder.record_load(self.simulation.ticks,
+                                      level_numbers[level], self.width,
+                                      self.height)
         level.load(self)
-        level_index = levels.index(level)
+        self.simulation.max_shots = level.max_shots
+        if self.session:
+            self.session.load_level(level_numbers[level], self.width,
+                                    self.height, level.max_shots)
+        if self.renderer:
+            self.scope.add_widget(self.renderer)
+        level_index = level_numbers[level]
         level_text = "level %s: %s" % (level_index + 1, level.name)
         self.current_level = level
         self.display_level_text(level_text)
         self.add_shot_counter(ShotCounter(
             max_shots=level.max_shots, x=30, y=15))
-
-    def new_background(self):
-        if self.stars:
-            self.remove_widget(self.stars)
-
-        self.stars = Stars(2000)
-        self.add_widget(self.stars)
+        if self.simulation.profiler:
+            self.profiler_overlay = ProfilerOverlay(
+                self.simulation.profiler, x=160, y=15)
+            self.scope.add_widget(self.profiler_overlay)
+        self.playing = True
+        self.start_ticking()
+
+    def memory_report(self, cycles=10, level=None):
+        """
+        load level (the current one, or the first) and restart it cycles
+        times; returns memory_snapshot() from before and after the
+        restarts, and the number of objects of each type that grew
+        """
+        if level is None:
+            from levels import levels
+            level = self.current_level or levels[0]
+        self.load_level(level)
+        before = self.memory_snapshot()
+        for i in range(cycles):
+            self.restart_level()
+        after = self.memory_snapshot()
+        grown = {}
+        for name, count in after['objects'].items():
+            growth = count - before['objects'].get(name, 0)
+            if growth > 0:
+                grown[name] = growth
+        return {'cycles': cycles, 'before': before, 'after': after,
+                'grown': grown}
+
+    def memory_snapshot(self):
+        """dict of live objects by type, what the scope holds, clock events
+        and resident bytes (None where kivy or the os can't tell)"""
+        get_events = getattr(Clock, 'get_events', None)
+        return {
+            'objects': live_objects(),
+            'scope': self.scope.counts(),
+            'body_widgets': len(self.body_widgets),
+            'children': len(self.children),
+            'clock_events': len(get_events()) if get_events else None,
+            'resident_bytes': resident_memory(),
+        }
+
+    def new_background(self, seed=0):
+        """show the star field for seed; every level has its own"""
+        if not self.stars:
+            self.stars = Stars(2000, pos=self.pos, size=self.size)
+            self.bind(pos=self.stars.setter('pos'),
+                      size=self.stars.setter('size'))
+            # behind everything else
+            self.add_widget(self.stars, index=len(self.children))
+        self.stars.seed = seed
 
     def next_level(self, *args):
-        next_level_index = levels.index(self.current_level) + 1
+        from levels import level_numbers, levels
+        next_level_index = level_numbers[self.current_level] + 1
         if next_level_index < len(levels):
             self.load_level(levels[next_level_index])
         else:
-            Clock.schedule_once(self.end_game, 2.)
+            self.scope.schedule_once(self.end_game, 2.)
 
     def on_touch_down(self, touch):
-        if hasattr(self, 'menu') and self.menu.collide_point(*touch.pos):
+        if self.menu and self.menu.parent and \
+                self.menu.collide_point(*touch.pos):
             for child in self.menu.children:
                 if child.collide_point(*touch.pos):
                     child.dispatch('on_touch_down', touch)
@@ -185,116 +363,382 @@ check back soon for more levels and updates"""
         if touch.is_double_tap:
             self.display_main_menu()
 
-        if self.current_level and \
-           len(self.shots) < self.current_level.max_shots:
-            self.add_aim_line(AimLine(start_pt=touch.pos))
+        if self.recorder:
+            from replay import TOUCH_DOWN
+            self.recorder.record_touch(TOUCH_DOWN, self.simulation.ticks,
+                                       touch.pos, touch.uid)
+        self.wake()
+        # shots are only flung while a level is being played, not from
+        # the menu or the end screen
+        if self.playing and self.simulation.touch_down(touch.pos, touch.uid):
+            if touch.uid in self.aim_lines:
+                self.remove_aim_line(touch.uid)
+            self.add_aim_line(touch.uid, AimLine(start_pt=touch.pos))
+            self.update_preview(touch.uid)
 
     def on_touch_move(self, touch):
-        if not self.aim_line:
-            return
-
-        try:
-            self.aim_line.end_pt = touch.pos
-        except (KeyError), e:
-            pass
+        if self.recorder:
+            from replay import TOUCH_MOVE
+            self.recorder.record_touch(TOUCH_MOVE, self.simulation.ticks,
+                                       touch.pos, touch.uid)
+        self.simulation.touch_move(touch.pos, touch.uid)
+        aim_line = self.aim_lines.get(touch.uid)
+        if aim_line:
+            aim_line.end_pt = touch.pos
+            self.update_preview(touch.uid)
 
     def on_touch_up(self, touch):
-        if not self.aim_line:
-            return
-
-        start_v = Vector(self.aim_line.start_pt)
-        end_v = Vector(self.aim_line.end_pt)
-
-        velocity_v = start_v - end_v
-        l = velocity_v.length()
-        if l == 0.:
-            return
-        velocity_v /= math.sqrt(l)
-
-        if len(self.shots) > MAX_SHOTS:
-            self.remove_shot(self.shots[0])
-
-        if self.current_level and \
-           len(self.shots) < self.current_level.max_shots:
-            self.add_shot(Shot(velocity=velocity_v, pos=(touch.x, touch.y)))
-
-        self.remove_aim_line(self.aim_line)
-
-    def remove_aim_line(self, aim_line):
-        self.remove_widget(aim_line)
-        self.aim_line = None
+        if self.recorder:
+            from replay import TOUCH_UP
+            self.recorder.record_touch(TOUCH_UP, self.simulation.ticks,
+                                       touch.pos, touch.uid)
+        self.release_touch(touch.pos, touch.uid)
+
+    def pause_session(self):
+        """tell netplay peers that no level is being played, and keep
+        taking in peers and what they send until one is"""
+        if self.session:
+            self.session.load_level(None, self.width, self.height, None)
+            self.scope.schedule_interval(self.poll_session, 0)
+
+    def poll_session(self, dt):
+        # with no level loaded, flings have nothing to be flung at
+        self.session.poll()
+
+    def pool_stats(self):
+        """dict of widget class name -> stats of its pool"""
+        return dict((widget_class.__name__, pool.stats())
+                    for widget_class, pool in self.widget_pools.items())
+
+    def release_touch(self, pos, touch_id):
+        """let go of touch_id's aim at pos, firing its shot if it has
+        one"""
+        shot, evicted_shots = self.simulation.touch_up(pos, touch_id)
+
+        for evicted_shot in evicted_shots:
+            self.remove_body_widget(evicted_shot)
+
+        if shot:
+            # several touches can let go in the same frame, so the widgets
+            # are added together when the frame is ticked
+            self.released_shots.append(shot)
+            if self.shot_counter:
+                self.shot_counter.increment()
+            self.wake()
+
+        if touch_id in self.aim_lines:
+            self.remove_aim_line(touch_id)
+
+    def remove_aim_line(self, touch_id):
+        self.scope.remove_widget(self.aim_lines.pop(touch_id))
 
     def remove_black_hole(self, black_hole):
-        self.black_holes.remove(black_hole)
-        self.remove_widget(black_hole)
+        self.simulation.remove_black_hole(black_hole)
+        self.remove_body_widget(black_hole)
+
+    def remove_body_widget(self, body):
+        widget = self.body_widgets.pop(body, None)
+        if widget:
+            self.remove_widget(widget)
+            self.widget_pools[type(widget)].release(widget)
 
     def remove_goal_point(self, goal_point):
-        self.goal_points.remove(goal_point)
-        self.remove_widget(goal_point)
+        self.simulation.remove_goal_point(goal_point)
+        self.remove_body_widget(goal_point)
 
     def remove_shot(self, shot):
-        self.remove_widget(shot)
-        self.shots.remove(shot)
+        self.remove_body_widget(shot)
+        self.simulation.remove_shot(shot)
 
     def restart_level(self, *args):
         self.load_level(self.current_level)
 
     def start_game(self, button):
+        from levels import levels
         self.load_level(levels[0])
 
+    def start_ticking(self):
+        if not self.ticking:
+            self.ticking = True
+            self.accumulator = 0.
+            Clock.schedule_interval(self.tick, 0)
+
+    def stop_ticking(self):
+        if self.ticking:
+            self.ticking = False
+            Clock.unschedule(self.tick)
+
     def tick(self, dt):
-        for shot1, shot2 in itertools.combinations(self.shots, 2):
-            if circles_collide(shot1, shot2):
-                shots_collide(shot1, shot2)
-                shot1.last_bounced = None
-                shot2.last_bounced = None
-
-        for shot in self.shots:
-            for black_hole in self.black_holes:
-                shot.gravitate_towards(black_hole)
-                if circles_collide(shot, black_hole):
-                    self.remove_widget(shot)
-                    self.shots.remove(shot)
-            for wall in self.walls:
-                if shot.collide_wall(wall):
-                    print "collide"
-            shot.move()
-
-        for goal_point in self.goal_points:
-            goal_point.move()
-
-            for shot in self.shots:
-                if circles_collide(goal_point, shot):
-                    self.remove_widget(goal_point)
-                    self.goal_points.remove(goal_point)
-
-                    if len(self.goal_points) == 0:
-                        Clock.schedule_once(self.next_level, 1)
-                    continue
+        simulation = self.simulation
+        profiler = simulation.profiler
+        if profiler:
+            profiler.start_frame()
+        if self.session:
+            for touch_id, start_pt, end_pt in self.session.poll():
+                self.fling_from_peer(touch_id, start_pt, end_pt)
+        if self.released_shots:
+            self.add_released_shots()
+        step_time = 1. / self.physics_rate
+        step_dt = physics.TICKS_PER_SECOND / self.physics_rate / self.substeps
+
+        self.accumulator += min(dt, MAX_FRAME_TIME)
+        steps = int(self.accumulator / step_time)
+        self.accumulator -= steps * step_time
+
+        for i in range(steps):
+            # keep where everything was before the last step, so frames
+            # can be drawn between the last two physics states
+            if i == steps - 1:
+                self.previous_positions = dict(
+                    (body, body.pos) for body in itertools.chain(
+                        simulation.shots, simulation.goal_points))
+
+            for j in range(self.substeps):
+                removed_shots, hit_goals = simulation.step(step_dt)
+
+                for body in itertools.chain(removed_shots, hit_goals):
+                    self.remove_body_widget(body)
+
+        if profiler:
+            profiler.begin()
+
+        alpha = self.accumulator / step_time
+        if self.renderer:
+            self.renderer.update(simulation.shots, simulation.goal_points,
+                                 self.previous_positions, alpha)
+        else:
+            for body in itertools.chain(simulation.shots,
+                                        simulation.goal_points):
+                self.body_widgets[body].sync(
+                    self.previous_positions.get(body), alpha)
+
+        if profiler:
+            profiler.lap('widget sync')
+
+        if self.session and steps:
+            self.session.send_snapshots(simulation)
+            if profiler:
+                profiler.lap('snapshots')
+
+        if profiler:
+            profiler.end_frame()
+            # refresh the overlay a couple of times a second
+            self.profiled_frames += 1
+            if self.profiler_overlay and \
+               self.profiled_frames % PROFILER_OVERLAY_FRAMES == 0:
+                self.profiler_overlay.update_text()
+
+        # nothing will move until a touch or a new body wakes the board up;
+        # a host keeps ticking, so it hears from its peers
+        if simulation.idle and not self.session:
+            self.stop_ticking()
+
+    def update_preview(self, touch_id):
+        aim_line = self.aim_lines.get(touch_id)
+        if self.predictor and aim_line:
+            step_dt = physics.TICKS_PER_SECOND / self.physics_rate / \
+                self.substeps
+            aim_line.preview_points = self.predictor.predict_aim(
+                self.simulation.aims.get(touch_id), step_dt)
+
+    def wake(self):
+        """start ticking again if the board went idle mid level"""
+        if self.playing:
+            self.start_ticking()
+
+
+class PeerBoard(FlingBoard):
+    """
+    Shows the game a netplay host is running instead of simulating one:
+    the simulation is a mirror that snapshots from the host keep up to
+    date. Touches aim the same as on any board, but a fling is sent to
+    the host, whose next snapshot brings the shot back.
+    """
+    def __init__(self, peer, **kwargs):
+        self.peer = peer
+        super(PeerBoard, self).__init__(simulation=peer.simulation, **kwargs)
+
+    def _on_keyboard_down(self, keyboard, keycode, text, modifiers):
+        # the host picks the levels
+        pass
+
+    def add_mirrored_widget(self, body):
+        if isinstance(body, physics.Wall):
+            self.add_body_widget(body, widgets.Wall)
+        elif isinstance(body, physics.BlackHole):
+            self.add_body_widget(body, widgets.BlackHole)
+        elif not self.renderer:
+            if isinstance(body, physics.Shot):
+                self.add_body_widget(body, widgets.Shot)
+            else:
+                self.add_body_widget(body, widgets.GoalPoint)
+
+    def display_main_menu(self, *args):
+        """there's no menu; the board shows whatever the host is playing,
+        and polls it every frame"""
+        self.playing = True
+        self.start_ticking()
+        if not self.stars:
+            Clock.schedule_once(lambda dt: self.new_background())
+
+    def load_peer_level(self, level_index):
+        from levels import levels
+        self.clear_level()
+        # clearing the mirror forgets the shots the host allows too
+        self.simulation.max_shots = self.peer.level[3]
+        if self.renderer:
+            self.scope.add_widget(self.renderer)
+        if level_index is None:
+            return
+        self.new_background(level_index + 1)
+        if level_index < len(levels):
+            self.display_level_text("level %s: %s" % (
+                level_index + 1, levels[level_index].name))
+
+    def on_touch_up(self, touch):
+        aim = self.simulation.aims.pop(touch.uid, None)
+        if aim:
+            self.peer.fling(aim[0], touch.pos)
+        if touch.uid in self.aim_lines:
+            self.remove_aim_line(touch.uid)
+
+    def tick(self, dt):
+        import netplay
+        for kind, data in self.peer.poll():
+            if kind == netplay.LEVEL:
+                self.load_peer_level(data[0])
+            else:
+                added, removed = data
+                for body in removed:
+                    self.remove_body_widget(body)
+                for body in added:
+                    self.add_mirrored_widget(body)
+
+        simulation = self.simulation
+        if self.renderer:
+            self.renderer.update(simulation.shots, simulation.goal_points)
+        else:
+            for body in itertools.chain(simulation.shots,
+                                        simulation.goal_points):
+                self.body_widgets[body].sync()
+
+        if self.peer.closed:
+            self.stop_ticking()
 
 
 class FlingyApp(App):
     def build(self):
-        return FlingBoard()
+        config = self.config
+        simulation = None
+        if config.getboolean('flingy', 'vectorized'):
+            from vectorized import VectorizedSimulation
+            simulation = VectorizedSimulation()
+        gravity_mode = config.get('flingy', 'gravity')
+        if gravity_mode:
+            import gravity
+            simulation = simulation or physics.Simulation()
+            shots_attract = config.getboolean('flingy', 'shots_attract')
+            if gravity_mode == 'barnes-hut':
+                simulation.gravity = gravity.BarnesHutGravity(
+                    config.getfloat('flingy', 'gravity_theta'), shots_attract)
+            else:
+                simulation.gravity = gravity.ExactGravity(shots_attract)
+        physics_rate = config.getint('flingy', 'physics_rate')
+        substeps = config.getint('flingy', 'substeps')
+        if config.getboolean('flingy', 'profile'):
+            simulation = simulation or physics.Simulation()
+            simulation.profiler = TickProfiler(
+                budget=config.getfloat('flingy', 'profile_budget_ms') / 1000.,
+                trace_dir=config.get('flingy', 'profile_trace_dir'))
+        self.recorder = None
+        if config.get('flingy', 'record'):
+            from replay import Recorder
+            self.recorder = Recorder(
+                config.get('flingy', 'record'), physics_rate, substeps,
+                vectorized=config.getboolean('flingy', 'vectorized'),
+                gravity=gravity_mode,
+                gravity_theta=config.getfloat('flingy', 'gravity_theta'),
+                shots_attract=config.getboolean('flingy', 'shots_attract'))
+        if config.getboolean('flingy', 'startup_report'):
+            Window.bind(on_flip=self.first_frame)
+        self.session = None
+        net_mode = config.get('flingy', 'net_mode')
+        if net_mode == 'peer':
+            from netplay import Peer
+            self.session = Peer(config.get('flingy', 'net_address'),
+                                config.getint('flingy', 'net_port'))
+            board = PeerBoard(
+                self.session,
+                batched_rendering=config.getboolean('flingy',
+                                                    'batched_rendering'))
+        else:
+            if net_mode == 'host':
+                from netplay import Host
+                self.session = Host(config.get('flingy', 'net_address'),
+                                    config.getint('flingy', 'net_port'))
+            board = FlingBoard(
+                simulation=simulation,
+                physics_rate=physics_rate,
+                substeps=substeps,
+                batched_rendering=config.getboolean('flingy',
+                                                    'batched_rendering'),
+                recorder=self.recorder,
+                preview_ticks=config.getint('flingy', 'preview_ticks'),
+                session=self.session)
+        startup.mark('build')
+        return board
 
     def build_config(self, config):
         config.setdefaults('graphics', {
             'width': '800',
             'height': '600'
         })
+        config.setdefaults('flingy', {
+            # keep shot state in numpy arrays and step gravity in batches
+            'vectorized': '0',
+            # fixed physics steps per second, and substeps per step
+            'physics_rate': '60',
+            'substeps': '1',
+            # draw shots and goal points from meshes instead of widgets
+            'batched_rendering': '0',
+            # write a replay log of every session to this path
+            'record': '',
+            # time every phase of the tick and show it on screen; frames
+            # over budget are written as traces to profile_trace_dir
+            'profile': '0',
+            'profile_budget_ms': '16.7',
+            'profile_trace_dir': '',
+            # ticks of predicted path to draw while aiming; 0 turns it off
+            'preview_ticks': '0',
+            # gravity engine: '' for the built in one, 'exact' or
+            # 'barnes-hut' (approximate, coarser as gravity_theta grows);
+            # either can have shots pull on each other too
+            'gravity': '',
+            'gravity_theta': '0.5',
+            'shots_attract': '0',
+            # print how long importing, building and drawing the first
+            # frame took
+            'startup_report': '0',
+            # '' to play alone, 'host' to run the game for peers on other
+            # boards, or 'peer' to join a host at net_address:net_port;
+            # bandwidth and latency stats are printed on quitting
+            'net_mode': '',
+            'net_address': '127.0.0.1',
+            'net_port': '7777',
+        })
 
-
-def circles_collide(widget_1, widget_2):
-    widget_distance = Vector(widget_1.pos).distance(Vector(widget_2.pos))
-    radial_distance = widget_1.r + widget_2.r
-    return widget_distance < radial_distance
-
-
-def shots_collide(shot1, shot2):
-    p1_v = Vector(shot1.pos)
-    p2_v = Vector(shot2.pos)
-    shot1.velocity = (p1_v - p2_v).normalize() / Vector(shot1.velocity).length()
-    shot2.velocity = (p2_v - p1_v).normalize() / Vector(shot2.velocity).length()
+    def first_frame(self, window):
+        window.unbind(on_flip=self.first_frame)
+        startup.mark('first frame')
+        print startup.report()
+
+    def on_stop(self):
+        if self.recorder:
+            self.recorder.close(self.root.simulation.ticks)
+        if self.session:
+            import json
+            print json.dumps(self.session.stats(), indent=2, sort_keys=True)
+            self.session.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,99 @@
+"""scripted motion for goal points
+
+A motion script gives a body's position and velocity as a function of the
+simulation's elapsed ticks, so scripted bodies don't need timers flipping
+their velocities, come out the same at any physics rate and go away along
+with their body when the level is cleared. Every script has
+state(t) -> (x, y, velocity_x, velocity_y), where t is the number of ticks
+since the level was loaded, and a duration: the ticks after which it stops
+moving, or None if it never does.
+"""
+
+import bisect
+import math
+
+
+class PingPong(object):
+    """start at start and move at velocity, turning back every period
+    ticks"""
+
+    duration = None
+
+    def __init__(self, start, velocity, period):
+        self.start = tuple(start)
+        self.velocity = tuple(velocity)
+        self.period = float(period)
+
+    def state(self, t):
+        (x, y), (velocity_x, velocity_y) = self.start, self.velocity
+        phase = t % (2 * self.period)
+        if phase < self.period:
+            distance = phase
+        else:
+            distance = 2 * self.period - phase
+            velocity_x, velocity_y = -velocity_x, -velocity_y
+        return (x + self.velocity[0] * distance,
+                y + self.velocity[1] * distance, velocity_x, velocity_y)
+
+
+class Oscillator(object):
+    """swing back and forth through center, amplitude away on either side,
+    once every period ticks"""
+
+    duration = None
+
+    def __init__(self, center, amplitude, period, phase=0.):
+        self.center = tuple(center)
+        self.amplitude = tuple(amplitude)
+        self.period = float(period)
+        self.phase = phase
+
+    def state(self, t):
+        angular_velocity = 2 * math.pi / self.period
+        angle = angular_velocity * t + self.phase
+        sin = math.sin(angle)
+        cos = math.cos(angle) * angular_velocity
+        return (self.center[0] + self.amplitude[0] * sin,
+                self.center[1] + self.amplitude[1] * sin,
+                self.amplitude[0] * cos, self.amplitude[1] * cos)
+
+
+class Waypoints(object):
+    """follow a path through points at speed pixels per tick; a looping
+    path heads back to the first point after the last, otherwise it stops
+    there"""
+
+    def __init__(self, points, speed, loop=True):
+        self.points = [tuple(point) for point in points]
+        if loop:
+            self.points.append(self.points[0])
+        self.speed = float(speed)
+        self.loop = loop
+        # distance along the path to each point
+        self.distances = [0.]
+        for (x1, y1), (x2, y2) in zip(self.points, self.points[1:]):
+            self.distances.append(self.distances[-1] +
+                                  math.hypot(x2 - x1, y2 - y1))
+        self.duration = None
+        if not self.distances[-1]:
+            self.duration = 0.
+        elif not loop:
+            self.duration = self.distances[-1] / self.speed
+
+    def state(self, t):
+        length = self.distances[-1]
+        travelled = self.speed * t
+        if not length:
+            return self.points[0] + (0., 0.)
+        if self.loop:
+            travelled %= length
+        elif travelled >= length:
+            return self.points[-1] + (0., 0.)
+
+        i = bisect.bisect_right(self.distances, travelled) - 1
+        (x1, y1), (x2, y2) = self.points[i], self.points[i + 1]
+        segment = self.distances[i + 1] - self.distances[i]
+        fraction = (travelled - self.distances[i]) / segment
+        return (x1 + (x2 - x1) * fraction, y1 + (y2 - y1) * fraction,
+                (x2 - x1) / segment * self.speed,
+                (y2 - y1) / segment * self.speed)
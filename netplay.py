@@ -0,0 +1,757 @@
+"""networked play: one board runs the game, peers watch and fling
+
+A Host is the authoritative end. It runs the only simulation that's
+stepped, takes flings from its peers and, every tick, sends each peer a
+snapshot of its shots, goal points, black holes and walls. A Peer keeps a
+mirror simulation that it never steps, updates it from the snapshots and
+sends back nothing but flings.
+
+Snapshots are delta encoded against the last one sent to the same peer:
+positions and velocities are quantized, a body that hasn't changed isn't
+sent at all, a small change goes as 16 bit differences and only new
+bodies are sent in full. Since every peer is on its own TCP connection,
+nothing is lost or reordered and deltas can build on each other.
+
+Both ends keep count of bytes and time: the host the bytes each peer
+costs against what full snapshots would have, and the round trip from
+sending a snapshot to the peer acknowledging it; the peer the time from
+sending a fling to getting the snapshot that has its shot in it. Trying
+it out with two processes on this machine:
+
+    python netplay.py test --flings 10
+
+or by hand, with
+
+    python netplay.py host --peers 1 --level 4
+    python netplay.py peer --flings 10
+"""
+
+import argparse
+import collections
+import errno
+import json
+import multiprocessing
+import random
+import socket
+import struct
+import sys
+import time
+import timeit
+
+import physics
+from profiling import percentile
+
+DEFAULT_PORT = 7777
+
+# snapshots carry positions in 1/16ths of a pixel and velocities in
+# 1/1024ths of a pixel per tick
+POSITION_QUANTUM = 1 / 16.
+VELOCITY_QUANTUM = 1 / 1024.
+
+# ticks a host goes without sending anything before it sends an empty
+# snapshot anyway, so peers know it's still there and acks keep flowing
+KEEPALIVE_TICKS = 30
+
+# bytes a peer can fall behind on before it's dropped
+MAX_BACKLOG = 1 << 20
+
+# round trips and latencies kept for the stats
+LATENCY_WINDOW = 600
+
+# flings from peers are made with touch ids above any real touch's
+PEER_TOUCH_IDS = 1 << 31
+
+FRAME = struct.Struct('<BI')
+# level index, width, height, max shots; -1 where there's no index or
+# limit
+LEVEL_PAYLOAD = struct.Struct('<hddh')
+# tick, host time, last fling applied, then how many of each record
+# follow: new bodies, new walls, small changes, full changes and removals
+SNAPSHOT_HEADER = struct.Struct('<IdIHHHHH')
+NEW_BODY = struct.Struct('<IBiiiiff')
+NEW_WALL = struct.Struct('<Ifffff')
+SMALL_CHANGE = struct.Struct('<Ihhhh')
+FULL_CHANGE = struct.Struct('<Iiiii')
+REMOVAL = struct.Struct('<I')
+# the tick and host time of the snapshot being acknowledged
+ACK_PAYLOAD = struct.Struct('<Id')
+# fling number, start x, start y, end x, end y
+FLING_PAYLOAD = struct.Struct('<Idddd')
+
+LEVEL, SNAPSHOT, ACK, FLING = range(4)
+
+SHOT, GOAL_POINT, BLACK_HOLE = range(3)
+
+BODY_CLASSES = {
+    SHOT: physics.Shot,
+    GOAL_POINT: physics.GoalPoint,
+    BLACK_HOLE: physics.BlackHole,
+}
+
+SMALL_DELTA = 1 << 15
+
+
+def quantize(body):
+    """(x, y, velocity x, velocity y) of body in snapshot units"""
+    return (int(round(body.x / POSITION_QUANTUM)),
+            int(round(body.y / POSITION_QUANTUM)),
+            int(round(body.velocity_x / VELOCITY_QUANTUM)),
+            int(round(body.velocity_y / VELOCITY_QUANTUM)))
+
+
+def quantized_state(simulation):
+    """sorted (kind, x, y, velocity x, velocity y) of every moving and
+    attracting body, in snapshot units, for comparing a host with its
+    peers"""
+    return sorted((kind,) + quantize(body)
+                  for kind, bodies in snapshot_bodies(simulation)
+                  for body in bodies)
+
+
+def snapshot_bodies(simulation):
+    return ((SHOT, simulation.shots), (GOAL_POINT, simulation.goal_points),
+            (BLACK_HOLE, simulation.black_holes))
+
+
+def fling_touch_id(peer_number, fling_number):
+    """the touch id a host makes a peer's fling with"""
+    return PEER_TOUCH_IDS | (peer_number & 0x7fff) << 16 | \
+        fling_number & 0xffff
+
+
+def apply_fling(simulation, touch_id, start_pt, end_pt):
+    """fling as a touch that goes down at start_pt and is dragged to and
+    let go at end_pt; returns what touch_up does"""
+    if not simulation.touch_down(start_pt, touch_id):
+        return None, []
+    simulation.touch_move(end_pt, touch_id)
+    return simulation.touch_up(end_pt, touch_id)
+
+
+def summarize(samples):
+    """mean, median, 99th percentile and max of samples in seconds, as
+    milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        'mean_ms': sum(ordered) / len(ordered) * 1e3,
+        'p50_ms': percentile(ordered, .5) * 1e3,
+        'p99_ms': percentile(ordered, .99) * 1e3,
+        'max_ms': ordered[-1] * 1e3,
+    }
+
+
+class SnapshotEncoder(object):
+    """
+    Makes snapshots of a simulation that only hold what changed since
+    the last one this encoder made. Each peer has seen a different
+    history, so each one needs its own.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def encode(self, simulation, tick, host_time, fling_ack=0):
+        """(snapshot payload, number of records in it, bytes a full
+        snapshot of everything would have taken)"""
+        sent = self.sent
+        seen = set()
+        new_bodies = []
+        new_walls = []
+        small_changes = []
+        full_changes = []
+
+        for kind, bodies in snapshot_bodies(simulation):
+            for body in bodies:
+                seen.add(body)
+                state = quantize(body)
+                previous = sent.get(body)
+                if previous is None:
+                    body_id = self.next_id
+                    self.next_id += 1
+                    new_bodies.append(NEW_BODY.pack(
+                        body_id, kind, state[0], state[1], state[2],
+                        state[3], body.r, body.mass))
+                else:
+                    body_id, previous_state = previous
+                    if state == previous_state:
+                        continue
+                    deltas = [value - previous_value for value, previous_value
+                              in zip(state, previous_state)]
+                    if all(-SMALL_DELTA <= delta < SMALL_DELTA
+                           for delta in deltas):
+                        small_changes.append(SMALL_CHANGE.pack(
+                            body_id, *deltas))
+                    else:
+                        full_changes.append(FULL_CHANGE.pack(
+                            body_id, *state))
+                sent[body] = (body_id, state)
+
+        for wall in simulation.walls:
+            seen.add(wall)
+            if wall not in sent:
+                body_id = self.next_id
+                self.next_id += 1
+                new_walls.append(NEW_WALL.pack(
+                    body_id, wall.start_point[0], wall.start_point[1],
+                    wall.end_point[0], wall.end_point[1], wall.thickness))
+                sent[wall] = (body_id, None)
+
+        removals = [body for body in sent if body not in seen]
+        removed = [REMOVAL.pack(sent.pop(body)[0]) for body in removals]
+
+        records = len(new_bodies) + len(new_walls) + len(small_changes) + \
+            len(full_changes) + len(removed)
+        payload = b''.join(
+            [SNAPSHOT_HEADER.pack(tick, host_time, fling_ack,
+                                  len(new_bodies), len(new_walls),
+                                  len(small_changes), len(full_changes),
+                                  len(removed))] +
+            new_bodies + new_walls + small_changes + full_changes + removed)
+        full_size = SNAPSHOT_HEADER.size + \
+            NEW_BODY.size * (len(sent) - len(simulation.walls)) + \
+            NEW_WALL.size * len(simulation.walls)
+        return payload, records, full_size
+
+    def reset(self):
+        """forget what was sent, so the next snapshot has everything"""
+        # body -> (id, state it was last sent with)
+        self.sent = {}
+        self.next_id = 0
+
+
+class SnapshotDecoder(object):
+    """keeps a mirror simulation in step with snapshots from an encoder"""
+
+    def __init__(self, simulation=None):
+        self.simulation = simulation or physics.Simulation()
+        # id -> (kind, body, state); walls have a kind and state of None
+        self.bodies = {}
+
+    def decode(self, payload):
+        """
+        apply a snapshot to the mirror; returns (tick, host time, last
+        fling applied, bodies added, bodies removed)
+        """
+        simulation = self.simulation
+        bodies = self.bodies
+        (tick, host_time, fling_ack, new_bodies, new_walls, small_changes,
+         full_changes, removals) = SNAPSHOT_HEADER.unpack_from(payload)
+        offset = SNAPSHOT_HEADER.size
+        added = []
+        removed = []
+
+        for i in range(new_bodies):
+            body_id, kind, x, y, velocity_x, velocity_y, r, mass = \
+                NEW_BODY.unpack_from(payload, offset)
+            offset += NEW_BODY.size
+            state = (x, y, velocity_x, velocity_y)
+            body = BODY_CLASSES[kind](r=r, mass=mass)
+            set_state(body, state)
+            if kind == SHOT:
+                simulation.add_shot(body)
+            elif kind == GOAL_POINT:
+                simulation.add_goal_point(body)
+            else:
+                simulation.add_black_hole(body)
+            bodies[body_id] = (kind, body, state)
+            added.append(body)
+
+        for i in range(new_walls):
+            body_id, start_x, start_y, end_x, end_y, thickness = \
+                NEW_WALL.unpack_from(payload, offset)
+            offset += NEW_WALL.size
+            wall = physics.Wall((start_x, start_y), (end_x, end_y),
+                                thickness)
+            simulation.add_wall(wall)
+            bodies[body_id] = (None, wall, None)
+            added.append(wall)
+
+        for i in range(small_changes):
+            body_id, dx, dy, dvx, dvy = SMALL_CHANGE.unpack_from(payload,
+                                                                 offset)
+            offset += SMALL_CHANGE.size
+            kind, body, (x, y, velocity_x, velocity_y) = bodies[body_id]
+            state = (x + dx, y + dy, velocity_x + dvx, velocity_y + dvy)
+            set_state(body, state)
+            bodies[body_id] = (kind, body, state)
+
+        for i in range(full_changes):
+            body_id, x, y, velocity_x, velocity_y = FULL_CHANGE.unpack_from(
+                payload, offset)
+            offset += FULL_CHANGE.size
+            kind, body, previous_state = bodies[body_id]
+            state = (x, y, velocity_x, velocity_y)
+            set_state(body, state)
+            bodies[body_id] = (kind, body, state)
+
+        for i in range(removals):
+            body_id, = REMOVAL.unpack_from(payload, offset)
+            offset += REMOVAL.size
+            kind, body, state = bodies.pop(body_id)
+            if kind == SHOT:
+                simulation.remove_shot(body)
+            elif kind == GOAL_POINT:
+                simulation.remove_goal_point(body)
+            elif kind == BLACK_HOLE:
+                simulation.remove_black_hole(body)
+            else:
+                simulation.remove_wall(body)
+            removed.append(body)
+
+        return tick, host_time, fling_ack, added, removed
+
+    def reset(self):
+        """empty the mirror, for a new level"""
+        self.bodies = {}
+        self.simulation.clear()
+
+
+def set_state(body, state):
+    x, y, velocity_x, velocity_y = state
+    body.x = x * POSITION_QUANTUM
+    body.y = y * POSITION_QUANTUM
+    body.velocity_x = velocity_x * VELOCITY_QUANTUM
+    body.velocity_y = velocity_y * VELOCITY_QUANTUM
+
+
+class Connection(object):
+    """
+    A non-blocking TCP socket that sends and receives whole frames of
+    (kind, payload), and counts every byte that goes through it
+    """
+
+    def __init__(self, sock):
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.socket = sock
+        self.incoming = b''
+        self.outgoing = b''
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.closed = False
+
+    def close(self, timeout=1.):
+        """close the socket, after giving whatever is still waiting to go
+        out up to timeout seconds to get there"""
+        if self.closed:
+            return
+        if self.outgoing:
+            try:
+                self.socket.settimeout(timeout)
+                self.socket.sendall(self.outgoing)
+                self.bytes_sent += len(self.outgoing)
+            except socket.error:
+                pass
+            self.outgoing = b''
+        self.socket.close()
+        self.closed = True
+
+    def flush(self):
+        """send as much of what's waiting as the socket will take"""
+        while self.outgoing and not self.closed:
+            try:
+                sent = self.socket.send(self.outgoing)
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                self.close()
+                return
+            self.bytes_sent += sent
+            self.outgoing = self.outgoing[sent:]
+        if len(self.outgoing) > MAX_BACKLOG:
+            self.outgoing = b''
+            self.close()
+
+    def receive(self):
+        """list of (kind, payload) of the frames that have come in full"""
+        while not self.closed:
+            try:
+                data = self.socket.recv(65536)
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                self.close()
+                break
+            if not data:
+                self.close()
+                break
+            self.bytes_received += len(data)
+            self.incoming += data
+
+        frames = []
+        incoming = self.incoming
+        offset = 0
+        while len(incoming) - offset >= FRAME.size:
+            kind, length = FRAME.unpack_from(incoming, offset)
+            end = offset + FRAME.size + length
+            if len(incoming) < end:
+                break
+            frames.append((kind, incoming[offset + FRAME.size:end]))
+            offset = end
+        self.incoming = incoming[offset:]
+        return frames
+
+    def send(self, kind, payload=b''):
+        if self.closed:
+            return
+        self.outgoing += FRAME.pack(kind, len(payload)) + payload
+        self.flush()
+
+
+class RemotePeer(object):
+    """a host's end of one peer's connection"""
+
+    def __init__(self, number, connection):
+        self.number = number
+        self.connection = connection
+        self.encoder = SnapshotEncoder()
+        # the last of the peer's flings that was applied, and the last
+        # one the peer has been told about
+        self.fling_ack = 0
+        self.sent_fling_ack = 0
+        self.flings = 0
+        self.last_sent_tick = None
+        self.round_trips = collections.deque(maxlen=LATENCY_WINDOW)
+        self.snapshots = 0
+        self.snapshot_bytes = 0
+        self.full_bytes = 0
+
+    def stats(self):
+        connection = self.connection
+        return {
+            'peer': self.number,
+            'connected': not connection.closed,
+            'flings': self.flings,
+            'snapshots': self.snapshots,
+            'bytes_sent': connection.bytes_sent,
+            'bytes_received': connection.bytes_received,
+            'snapshot_bytes': self.snapshot_bytes,
+            'full_snapshot_bytes': self.full_bytes,
+            'compression': (self.full_bytes / float(self.snapshot_bytes)
+                            if self.snapshot_bytes else None),
+            'round_trip': summarize(self.round_trips),
+        }
+
+
+class Host(object):
+    """
+    The authoritative end: listens for peers, takes their flings and sends
+    each of them snapshots of the simulation
+    """
+
+    def __init__(self, address='127.0.0.1', port=DEFAULT_PORT):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((address, port))
+        listener.listen(8)
+        listener.setblocking(False)
+        self.listener = listener
+        # the port actually listened on, for when port was 0
+        self.port = listener.getsockname()[1]
+        self.level = None
+        self.peers = []
+        self.peers_joined = 0
+
+    def accept(self):
+        while True:
+            try:
+                sock, address = self.listener.accept()
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            peer = RemotePeer(self.peers_joined, Connection(sock))
+            self.peers_joined += 1
+            self.peers.append(peer)
+            if self.level:
+                peer.connection.send(LEVEL, self.level)
+
+    def close(self):
+        for peer in self.peers:
+            peer.connection.close()
+        self.listener.close()
+
+    def load_level(self, level_index, width, height, max_shots):
+        """tell every peer, now and as they join, that a level was loaded;
+        the next snapshot they get has all of it"""
+        self.level = LEVEL_PAYLOAD.pack(
+            -1 if level_index is None else level_index, width, height,
+            -1 if max_shots is None else max_shots)
+        for peer in self.peers:
+            peer.encoder.reset()
+            peer.connection.send(LEVEL, self.level)
+
+    def poll(self):
+        """take in new peers and everything peers have sent; returns a list
+        of (touch id, start point, end point) for each fling"""
+        self.accept()
+        flings = []
+        for peer in self.peers:
+            frames = peer.connection.receive()
+            now = timeit.default_timer()
+            for kind, payload in frames:
+                if kind == ACK:
+                    tick, host_time = ACK_PAYLOAD.unpack(payload)
+                    peer.round_trips.append(now - host_time)
+                elif kind == FLING:
+                    number, start_x, start_y, end_x, end_y = \
+                        FLING_PAYLOAD.unpack(payload)
+                    peer.fling_ack = max(peer.fling_ack, number)
+                    peer.flings += 1
+                    flings.append((fling_touch_id(peer.number, number),
+                                   (start_x, start_y), (end_x, end_y)))
+        self.peers = [peer for peer in self.peers
+                      if not peer.connection.closed]
+        return flings
+
+    def send_snapshots(self, simulation, force=False):
+        """send every peer what changed since its last snapshot; peers
+        that are up to date get nothing, other than a keepalive every so
+        often, unless force is set"""
+        tick = simulation.ticks
+        host_time = timeit.default_timer()
+        for peer in self.peers:
+            payload, records, full_size = peer.encoder.encode(
+                simulation, tick, host_time, peer.fling_ack)
+            if not (records or force or peer.last_sent_tick is None or
+                    peer.fling_ack != peer.sent_fling_ack or
+                    tick - peer.last_sent_tick >= KEEPALIVE_TICKS):
+                continue
+            peer.connection.send(SNAPSHOT, payload)
+            peer.last_sent_tick = tick
+            peer.sent_fling_ack = peer.fling_ack
+            peer.snapshots += 1
+            peer.snapshot_bytes += FRAME.size + len(payload)
+            peer.full_bytes += FRAME.size + full_size
+
+    def stats(self):
+        """stats of every connected peer"""
+        return [peer.stats() for peer in self.peers]
+
+
+class Peer(object):
+    """
+    The other end: mirrors the host's simulation from its snapshots and
+    sends it flings
+    """
+
+    def __init__(self, address='127.0.0.1', port=DEFAULT_PORT,
+                 simulation=None, timeout=5.):
+        self.connection = Connection(
+            socket.create_connection((address, port), timeout))
+        self.decoder = SnapshotDecoder(simulation)
+        self.simulation = self.decoder.simulation
+        # (level index, width, height, max shots) of the host's level
+        self.level = None
+        self.tick = 0
+        self.flings_sent = 0
+        self.fling_latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        # fling number -> when it was sent, until a snapshot has it
+        self.pending_flings = collections.OrderedDict()
+        self.last_snapshot = None
+        self.snapshot_intervals = collections.deque(maxlen=LATENCY_WINDOW)
+        self.snapshots = 0
+
+    @property
+    def closed(self):
+        return self.connection.closed
+
+    def close(self):
+        self.connection.close()
+
+    def fling(self, start_pt, end_pt):
+        """ask the host to fling a shot from start_pt to end_pt"""
+        self.flings_sent += 1
+        self.pending_flings[self.flings_sent] = timeit.default_timer()
+        self.connection.send(FLING, FLING_PAYLOAD.pack(
+            self.flings_sent, start_pt[0], start_pt[1], end_pt[0],
+            end_pt[1]))
+
+    def poll(self):
+        """
+        apply what the host sent, one frame at a time; yields
+        (LEVEL, (level index, width, height, max shots)) after the mirror
+        is emptied for a new level and (SNAPSHOT, (bodies added, bodies
+        removed)) after a snapshot is applied
+        """
+        for kind, payload in self.connection.receive():
+            if kind == LEVEL:
+                level_index, width, height, max_shots = \
+                    LEVEL_PAYLOAD.unpack(payload)
+                self.level = (None if level_index < 0 else level_index,
+                              width, height,
+                              None if max_shots < 0 else max_shots)
+                self.decoder.reset()
+                simulation = self.simulation
+                simulation.width = width
+                simulation.height = height
+                simulation.max_shots = self.level[3]
+                yield LEVEL, self.level
+            elif kind == SNAPSHOT:
+                now = timeit.default_timer()
+                tick, host_time, fling_ack, added, removed = \
+                    self.decoder.decode(payload)
+                self.tick = tick
+                self.snapshots += 1
+                if self.last_snapshot is not None:
+                    self.snapshot_intervals.append(now - self.last_snapshot)
+                self.last_snapshot = now
+                pending = self.pending_flings
+                while pending and next(iter(pending)) <= fling_ack:
+                    number, sent = pending.popitem(last=False)
+                    self.fling_latencies.append(now - sent)
+                self.connection.send(ACK, ACK_PAYLOAD.pack(tick, host_time))
+                yield SNAPSHOT, (added, removed)
+
+    def stats(self):
+        connection = self.connection
+        return {
+            'connected': not connection.closed,
+            'tick': self.tick,
+            'snapshots': self.snapshots,
+            'bytes_sent': connection.bytes_sent,
+            'bytes_received': connection.bytes_received,
+            'flings_sent': self.flings_sent,
+            'flings_pending': len(self.pending_flings),
+            'fling_latency': summarize(self.fling_latencies),
+            'snapshot_interval': summarize(self.snapshot_intervals),
+        }
+
+
+def run_host(level_index=0, address='127.0.0.1', port=DEFAULT_PORT,
+             peers=1, ticks=600, rate=60, max_shots=None, ready=None,
+             wait=30.):
+    """
+    host level headlessly in real time for ticks, once peers have
+    joined; returns the host's stats and final state. ready is called
+    with the port once it's listening
+    """
+    from levels import levels
+    host = Host(address, port)
+    if ready:
+        ready(host.port)
+    give_up = timeit.default_timer() + wait
+    while len(host.peers) < peers and timeit.default_timer() < give_up:
+        host.poll()
+        time.sleep(.01)
+
+    level = levels[level_index]
+    simulation = physics.Simulation()
+    level.load(simulation)
+    simulation.max_shots = max_shots or level.max_shots
+    host.load_level(level_index, simulation.width, simulation.height,
+                    simulation.max_shots)
+
+    started = timeit.default_timer()
+    for tick in range(ticks):
+        for touch_id, start_pt, end_pt in host.poll():
+            apply_fling(simulation, touch_id, start_pt, end_pt)
+        simulation.step()
+        host.send_snapshots(simulation)
+        delay = started + (tick + 1.) / rate - timeit.default_timer()
+        if delay > 0:
+            time.sleep(delay)
+    host.send_snapshots(simulation, force=True)
+    # a moment for the last acks to come back
+    time.sleep(.1)
+    host.poll()
+    result = {'host': host.stats(), 'ticks': simulation.ticks,
+              'state': quantized_state(simulation)}
+    host.close()
+    return result
+
+
+def run_peer(address='127.0.0.1', port=DEFAULT_PORT, flings=10,
+             interval=.25, seed=0):
+    """join a host and fling at random every interval seconds until it
+    goes away; returns the peer's stats and final state"""
+    peer = Peer(address, port)
+    generator = random.Random(seed)
+    next_fling = None
+    while not peer.closed:
+        for kind, data in peer.poll():
+            if kind == LEVEL and next_fling is None:
+                next_fling = timeit.default_timer() + interval
+        if next_fling is not None and peer.flings_sent < flings and \
+           timeit.default_timer() >= next_fling:
+            simulation = peer.simulation
+            start_pt = (generator.uniform(0, simulation.width),
+                        generator.uniform(0, simulation.height))
+            end_pt = (start_pt[0] + generator.uniform(-80, 80),
+                      start_pt[1] + generator.uniform(-80, 80))
+            peer.fling(start_pt, end_pt)
+            next_fling += interval
+        time.sleep(.002)
+    return {'peer': peer.stats(), 'state': quantized_state(peer.simulation)}
+
+
+def _host_process(queue, kwargs):
+    queue.put(('result', run_host(ready=lambda port: queue.put(('port',
+                                                                port)),
+                                  **kwargs)))
+
+
+def run_test(level_index=0, ticks=600, flings=10, max_shots=physics.MAX_SHOTS):
+    """host in another process and join it from this one; returns both
+    ends' results and whether the peer ended up where the host did"""
+    queue = multiprocessing.Queue()
+    host = multiprocessing.Process(target=_host_process, args=(queue, {
+        'level_index': level_index, 'port': 0, 'ticks': ticks,
+        'max_shots': max_shots}))
+    host.start()
+    try:
+        kind, port = queue.get(timeout=30)
+        peer_result = run_peer(port=port, flings=flings,
+                               interval=ticks / 60. / (flings + 2))
+        kind, host_result = queue.get(timeout=30)
+    finally:
+        host.join()
+    return {
+        'host': host_result['host'],
+        'peer': peer_result['peer'],
+        'ticks': host_result['ticks'],
+        'bodies': len(host_result['state']),
+        'in_sync': host_result['state'] == peer_result['state'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('mode', choices=('host', 'peer', 'test'))
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--level', type=int, default=0,
+                        help='index of the level to host')
+    parser.add_argument('--ticks', type=int, default=600,
+                        help='ticks to host the level for')
+    parser.add_argument('--peers', type=int, default=1,
+                        help='peers to wait for before starting')
+    parser.add_argument('--max-shots', type=int, default=physics.MAX_SHOTS,
+                        help='shots allowed at once, instead of the '
+                        'level\'s own limit')
+    parser.add_argument('--flings', type=int, default=10,
+                        help='random flings a peer makes')
+    parser.add_argument('--interval', type=float, default=.25,
+                        help='seconds between a peer\'s flings')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.mode == 'host':
+        result = run_host(args.level, args.address, args.port, args.peers,
+                          args.ticks, max_shots=args.max_shots)
+        del result['state']
+    elif args.mode == 'peer':
+        result = run_peer(args.address, args.port, args.flings,
+                          args.interval, args.seed)
+        del result['state']
+    else:
+        result = run_test(args.level, args.ticks, args.flings,
+                          args.max_shots)
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
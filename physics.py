@@ -0,0 +1,839 @@
+"""headless simulation of everything that moves, bounces or gets eaten
+
+Nothing in here touches kivy, so a level can be stepped without a window.
+The widgets in widgets.py only mirror the state of the bodies defined here.
+"""
+
+import itertools
+import math
+
+from broadphase import SpatialGrid
+
+# velocities are in pixels per tick, and a tick is a 60th of a second
+TICKS_PER_SECOND = 60.
+
+# set a limit on the number of shots allowed on screen at once
+MAX_SHOTS = 20
+
+# most wall bounces a fast shot's swept move will find in one tick
+MAX_SWEPT_BOUNCES = 4
+
+# a shot that has left the board is culled once the black holes can't turn
+# it around before it's this many board diagonals away from them
+ESCAPE_DISTANCE = 4.
+
+
+def rotate(x, y, angle):
+    """rotate (x, y) by angle degrees; same as kivy.vector.Vector.rotate"""
+    angle = math.radians(angle)
+    return ((x * math.cos(angle)) - (y * math.sin(angle)),
+            (y * math.cos(angle)) + (x * math.sin(angle)))
+
+
+def normalize(x, y):
+    """unit vector of (x, y); same as kivy.vector.Vector.normalize"""
+    if x == 0 and y == 0:
+        return 0., 0.
+    length = math.sqrt(x ** 2 + y ** 2)
+    return x / length, y / length
+
+
+def angle_between(ax, ay, bx, by):
+    """angle in degrees from a to b; same as kivy.vector.Vector.angle"""
+    return -(180 / math.pi) * math.atan2(ax * by - ay * bx,
+                                         ax * bx + ay * by)
+
+
+def distance(x1, y1, x2, y2):
+    return math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
+
+
+def distance2(x1, y1, x2, y2):
+    """squared distance; compare it with a squared length to save the
+    square root"""
+    dx = x1 - x2
+    dy = y1 - y2
+    return dx * dx + dy * dy
+
+
+def sweep_circle(x, y, dx, dy, cx, cy, radius):
+    """fraction of the way along the move from (x, y) by (dx, dy) at which
+    the point first comes within radius of (cx, cy), or None if it doesn't
+    or is already there at the start"""
+    fx = x - cx
+    fy = y - cy
+    c = fx * fx + fy * fy - radius * radius
+    if c <= 0:
+        return None
+    a = dx * dx + dy * dy
+    b = 2 * (fx * dx + fy * dy)
+    if not a or b >= 0:
+        return None
+    discriminant = b * b - 4 * a * c
+    if discriminant < 0:
+        return None
+    t = (-b - math.sqrt(discriminant)) / (2 * a)
+    if t <= 1.:
+        return t
+    return None
+
+
+def fling_velocity(start_pt, end_pt):
+    """velocity of a shot aimed by dragging from start_pt to end_pt, or
+    None if the drag had no length"""
+    velocity_x = start_pt[0] - end_pt[0]
+    velocity_y = start_pt[1] - end_pt[1]
+    l = math.sqrt(velocity_x ** 2 + velocity_y ** 2)
+    if l == 0.:
+        return None
+    l = math.sqrt(l)
+    return velocity_x / l, velocity_y / l
+
+
+class Body(object):
+    """a circle with a position and a velocity"""
+    r = 0.
+    mass = 0.
+
+    def __init__(self, pos=(0, 0), x=None, y=None, velocity=(0, 0),
+                 velocity_x=None, velocity_y=None, r=None, mass=None):
+        self.x, self.y = pos
+        self.velocity_x, self.velocity_y = velocity
+        if x is not None:
+            self.x = x
+        if y is not None:
+            self.y = y
+        if velocity_x is not None:
+            self.velocity_x = velocity_x
+        if velocity_y is not None:
+            self.velocity_y = velocity_y
+        if r is not None:
+            self.r = r
+        if mass is not None:
+            self.mass = mass
+
+    @property
+    def pos(self):
+        return self.x, self.y
+
+    @pos.setter
+    def pos(self, pos):
+        self.x, self.y = pos
+
+    @property
+    def velocity(self):
+        return self.velocity_x, self.velocity_y
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.velocity_x, self.velocity_y = velocity
+
+    def collide_point(self, x, y):
+        dx = x - self.x
+        dy = y - self.y
+        return dx * dx + dy * dy < self.r * self.r
+
+    def move(self, dt=1.):
+        self.x += self.velocity_x * dt
+        self.y += self.velocity_y * dt
+
+
+class BlackHole(Body):
+    r = 25.
+    mass = 50.
+
+
+class GoalPoint(Body):
+    r = 5.
+
+    def __init__(self, motion=None, **kwargs):
+        super(GoalPoint, self).__init__(**kwargs)
+        # a motion script from motion.py, which moves the goal point
+        # instead of its velocity
+        self.motion = motion
+        if motion:
+            self.move_to(0.)
+
+    def move_to(self, t):
+        """put a scripted goal point where its motion has it at t ticks"""
+        self.x, self.y, self.velocity_x, self.velocity_y = \
+            self.motion.state(t)
+
+    def moving(self, t):
+        """True if the goal point still moves after t ticks"""
+        if self.motion:
+            duration = self.motion.duration
+            return duration is None or t < duration
+        return bool(self.velocity_x or self.velocity_y)
+
+
+class Shot(Body):
+    r = 10.
+    mass = 1.
+
+    def __init__(self, **kwargs):
+        super(Shot, self).__init__(**kwargs)
+        self.last_bounced_ticks = 0
+        self.last_bounced_wall = None
+        # set by the simulation it's added to
+        self.number = None
+
+    def bounce(self, wall, normal_x, normal_y):
+        """reflect off of wall's surface with unit normal (normal_x,
+        normal_y)"""
+        along_normal = self.velocity_x * normal_x + self.velocity_y * normal_y
+        if along_normal < 0:
+            self.velocity = (self.velocity_x - 2 * along_normal * normal_x,
+                             self.velocity_y - 2 * along_normal * normal_y)
+        self.last_bounced_wall = wall
+        self.last_bounced_ticks = 0
+
+    def move(self, dt=1.):
+        self.x += self.velocity_x * dt
+        self.y += self.velocity_y * dt
+        self.last_bounced_ticks += dt
+
+    def gravitate_towards(self, body, dt=1.):
+        gravity_x = body.x - self.x
+        gravity_y = body.y - self.y
+        length2 = gravity_x * gravity_x + gravity_y * gravity_y
+        self.velocity_x += (gravity_x * 1. / length2) * body.mass * dt
+        self.velocity_y += (gravity_y * 1. / length2) * body.mass * dt
+
+    def collide_wall(self, wall):
+        # don't collide with this wall if we just did so; this
+        # eliminates a huge class of weird behaviors
+        if self.last_bounced_wall == wall and self.last_bounced_ticks < 5:
+            return
+
+        x = self.x
+        y = self.y
+        margin = self.r + wall.thickness / 2.
+        min_x, min_y, max_x, max_y = wall.bounds
+        if x < min_x - margin or x > max_x + margin or \
+           y < min_y - margin or y > max_y + margin:
+            return
+
+        deflect_edge = None
+        closest_point = None
+        r2 = self.r * self.r
+
+        for point in wall.corners:
+            if distance2(x, y, point[0], point[1]) < r2:
+                if not closest_point or \
+                   distance2(x, y, point[0], point[1]) < \
+                   distance2(closest_point[0], closest_point[1],
+                             point[0], point[1]):
+                    closest_point = point
+
+        if closest_point:
+            # take the deflection edge to be the normal of here to the corner
+            deflect_edge = rotate(x - point[0], y - point[1], 90)
+
+        else:
+            for e0, e1, edge, normal, edge_bounds in wall.edges:
+                # project onto the edge's line along its normal
+                normal_x, normal_y = normal
+                offset = (x - e0[0]) * normal_x + (y - e0[1]) * normal_y
+                foot_x = x - offset * normal_x
+                foot_y = y - offset * normal_y
+                dist_from_edge = abs(offset)
+
+                # if the shot touches the wall here
+                if edge_bounds[0] <= foot_x <= edge_bounds[2] and \
+                   edge_bounds[1] <= foot_y <= edge_bounds[3] and \
+                   dist_from_edge < margin:
+                    if not deflect_edge or \
+                       dist_from_edge < dist_from_deflect_edge:
+                        deflect_edge = edge
+                        dist_from_deflect_edge = dist_from_edge
+
+        if deflect_edge:
+            angle = angle_between(self.velocity_x, self.velocity_y,
+                                  deflect_edge[0], deflect_edge[1])
+            self.velocity = rotate(self.velocity_x, self.velocity_y,
+                                   -2 * angle)
+            self.last_bounced_wall = wall
+            self.last_bounced_ticks = 0
+            return True
+
+
+class Wall(object):
+    """
+    A thick line segment that shots bounce off of. Its corners, edges,
+    edge normals and bounding box are worked out once, whenever
+    start_point, end_point or thickness are set.
+    """
+
+    def __init__(self, start_point=(0, 0), end_point=(0, 0), thickness=4.):
+        self._start_point = tuple(start_point)
+        self._end_point = tuple(end_point)
+        self._thickness = thickness
+        self.update_points()
+
+    @property
+    def end_point(self):
+        return self._end_point
+
+    @end_point.setter
+    def end_point(self, end_point):
+        self._end_point = tuple(end_point)
+        self.update_points()
+
+    @property
+    def start_point(self):
+        return self._start_point
+
+    @start_point.setter
+    def start_point(self, start_point):
+        self._start_point = tuple(start_point)
+        self.update_points()
+
+    def sweep(self, x, y, dx, dy, r):
+        """
+        where a shot of radius r moving from (x, y) by (dx, dy) first
+        touches this wall, as (fraction of the move, unit normal x, unit
+        normal y), or None if it doesn't or is touching it already. The
+        wall's ends are taken as round, which is close enough for walls
+        as thin as these
+        """
+        radius = r + self._thickness / 2.
+        start_x, start_y = self._start_point
+        direction_x, direction_y = self.direction
+        # the move in terms of along and across the wall's center line
+        relative_x = x - start_x
+        relative_y = y - start_y
+        along = relative_x * direction_x + relative_y * direction_y
+        across = relative_y * direction_x - relative_x * direction_y
+        if abs(across) < radius and 0 <= along <= self.length:
+            return None
+        d_along = dx * direction_x + dy * direction_y
+        d_across = dy * direction_x - dx * direction_y
+
+        hit = None
+        if abs(across) >= radius and across * d_across < 0:
+            side = radius if across > 0 else -radius
+            t = (side - across) / d_across
+            if t <= 1. and 0 <= along + t * d_along <= self.length:
+                sign = 1. if across > 0 else -1.
+                hit = (t, -direction_y * sign, direction_x * sign)
+
+        for end_x, end_y in (self._start_point, self._end_point):
+            t = sweep_circle(x, y, dx, dy, end_x, end_y, radius)
+            if t is not None and (hit is None or t < hit[0]):
+                hit = (t, (x + t * dx - end_x) / radius,
+                       (y + t * dy - end_y) / radius)
+        return hit
+
+    @property
+    def thickness(self):
+        return self._thickness
+
+    @thickness.setter
+    def thickness(self, thickness):
+        self._thickness = thickness
+        self.update_points()
+
+    def update_points(self):
+        start_point = self._start_point
+        end_point = self._end_point
+        # orthogonal vector
+        o_x, o_y = rotate(*normalize(start_point[0] - end_point[0],
+                                     start_point[1] - end_point[1]),
+                          angle=90)
+        o_x *= self._thickness / 2.
+        o_y *= self._thickness / 2.
+        self.quad_points = [
+            start_point[0] + o_x, start_point[1] + o_y,
+            start_point[0] - o_x, start_point[1] - o_y,
+            end_point[0] - o_x, end_point[1] - o_y,
+            end_point[0] + o_x, end_point[1] + o_y,
+        ]
+
+        self.corners = list(zip(self.quad_points[0::2],
+                                self.quad_points[1::2]))
+        self.length = distance(start_point[0], start_point[1],
+                               end_point[0], end_point[1])
+        self.direction = normalize(end_point[0] - start_point[0],
+                                   end_point[1] - start_point[1])
+        self.bounds = (min(self.quad_points[0::2]),
+                       min(self.quad_points[1::2]),
+                       max(self.quad_points[0::2]),
+                       max(self.quad_points[1::2]))
+
+        # (start, end, edge vector, unit normal, bounding box) of each edge
+        self.edges = []
+        for i, e0 in enumerate(self.corners):
+            e1 = self.corners[(i + 1) % 4]
+            edge = (e0[0] - e1[0], e0[1] - e1[1])
+            normal = normalize(*rotate(edge[0], edge[1], 90))
+            edge_bounds = (min(e0[0], e1[0]), min(e0[1], e1[1]),
+                           max(e0[0], e1[0]), max(e0[1], e1[1]))
+            self.edges.append((e0, e1, edge, normal, edge_bounds))
+
+
+def circles_collide(body_1, body_2):
+    dx = body_1.x - body_2.x
+    dy = body_1.y - body_2.y
+    radial_distance = body_1.r + body_2.r
+    return dx * dx + dy * dy < radial_distance * radial_distance
+
+
+def shots_collide(shot1, shot2):
+    normal_x, normal_y = normalize(shot1.x - shot2.x, shot1.y - shot2.y)
+    velocity_x = shot1.velocity_x
+    velocity_y = shot1.velocity_y
+    speed1 = math.sqrt(velocity_x * velocity_x + velocity_y * velocity_y)
+    velocity_x = shot2.velocity_x
+    velocity_y = shot2.velocity_y
+    speed2 = math.sqrt(velocity_x * velocity_x + velocity_y * velocity_y)
+    shot1.velocity_x = normal_x / speed1
+    shot1.velocity_y = normal_y / speed1
+    shot2.velocity_x = -normal_x / speed2
+    shot2.velocity_y = -normal_y / speed2
+
+
+def move_shot(shot, walls, dt=1.):
+    """
+    move shot on by dt ticks. A shot fast enough to pass through a wall
+    or a goal point in one move is swept along its path instead, bouncing
+    off of the walls it meets on the way in the order it meets them; for
+    those, returns the path as a list of (fraction of the tick, x, y), so
+    goal points can be checked against all of it, or None for ordinary
+    moves
+    """
+    velocity_x = shot.velocity_x
+    velocity_y = shot.velocity_y
+    r = shot.r
+    # a shot moving no further than its radius can't skip past a wall or
+    # a goal point
+    if (velocity_x * velocity_x + velocity_y * velocity_y) * dt * dt <= \
+       r * r:
+        shot.move(dt)
+        return None
+
+    path = [(0., shot.x, shot.y)]
+    done = 0.
+    for i in range(MAX_SWEPT_BOUNCES):
+        x = shot.x
+        y = shot.y
+        remaining = dt - done
+        dx = shot.velocity_x * remaining
+        dy = shot.velocity_y * remaining
+        min_x = min(x, x + dx) - r
+        max_x = max(x, x + dx) + r
+        min_y = min(y, y + dy) - r
+        max_y = max(y, y + dy) + r
+
+        first_hit = None
+        for wall in walls:
+            if wall is shot.last_bounced_wall and \
+               shot.last_bounced_ticks < 5:
+                continue
+            wall_min_x, wall_min_y, wall_max_x, wall_max_y = wall.bounds
+            if wall_max_x < min_x or wall_min_x > max_x or \
+               wall_max_y < min_y or wall_min_y > max_y:
+                continue
+            hit = wall.sweep(x, y, dx, dy, r)
+            if hit and (first_hit is None or hit[0] < first_hit[0]):
+                first_hit = hit + (wall,)
+
+        if first_hit is None:
+            break
+        t, normal_x, normal_y, wall = first_hit
+        shot.move(remaining * t)
+        done += remaining * t
+        path.append((done / dt, shot.x, shot.y))
+        shot.bounce(wall, normal_x, normal_y)
+
+    shot.move(dt - done)
+    path.append((1., shot.x, shot.y))
+    return path
+
+
+def sweep_path(path, x, y, radius):
+    """fraction of the tick at which a swept path from move_shot first
+    comes within radius of (x, y), or None"""
+    for (t0, x0, y0), (t1, x1, y1) in zip(path, path[1:]):
+        if distance2(x0, y0, x, y) < radius * radius:
+            return t0
+        t = sweep_circle(x0, y0, x1 - x0, y1 - y0, x, y, radius)
+        if t is not None:
+            return t0 + t * (t1 - t0)
+    return None
+
+
+class BodyList(list):
+    """
+    A list of bodies that knows where each one is, so removing one is a
+    swap with the last body instead of a search and a shuffle. That means
+    removing a body changes the order of the rest. Only append, remove
+    and discard keep the positions right.
+    """
+
+    def __init__(self, bodies=()):
+        super(BodyList, self).__init__()
+        self.positions = {}
+        for body in bodies:
+            self.append(body)
+
+    def __contains__(self, body):
+        return body in self.positions
+
+    def append(self, body):
+        self.positions[body] = len(self)
+        super(BodyList, self).append(body)
+
+    def discard(self, body):
+        """remove body if it's in the list"""
+        if body in self.positions:
+            self.remove(body)
+
+    def remove(self, body):
+        position = self.positions.pop(body)
+        last = self.pop()
+        if last is not body:
+            self[position] = last
+            self.positions[last] = position
+
+
+class Simulation(object):
+    """
+    Owns all the bodies on a board and steps them one tick at a
+    time. Levels load straight into a simulation the same way they load
+    into a FlingBoard, so this doubles as a headless board.
+    """
+    def __init__(self, width=800, height=600):
+        self.width = width
+        self.height = height
+        # touch id -> [start point, end point] of every shot being aimed
+        self.aims = {}
+        self.max_shots = None
+        # a profiling.TickProfiler, to time each phase of every step
+        self.profiler = None
+        # an engine from gravity.py to pull shots with, instead of pulling
+        # each one towards each black hole
+        self.gravity = None
+        self.ticks = 0
+        self.elapsed = 0.
+        # called once, from the step that hits the last goal point
+        self.on_complete = None
+        self.completed = False
+        self.black_holes = []
+        self.goal_points = BodyList()
+        self.shot_grid = SpatialGrid()
+        self.shots = BodyList()
+        # shots are numbered as they're added, so the oldest can be found
+        # whatever order they end up in
+        self.shots_added = 0
+        # shot -> path, for the shots that were swept last move
+        self.swept_paths = {}
+        self.walls = []
+
+    def add_black_hole(self, black_hole):
+        self.black_holes.append(black_hole)
+
+    def add_goal_point(self, goal_point):
+        self.goal_points.append(goal_point)
+
+    def add_shot(self, shot):
+        shot.number = self.shots_added
+        self.shots_added += 1
+        self.shots.append(shot)
+
+    def add_wall(self, wall):
+        self.walls.append(wall)
+
+    def bounds(self):
+        """(min x, min y, max x, max y) of the board and everything on it
+        that a shot could run into"""
+        min_x, min_y, max_x, max_y = 0., 0., self.width, self.height
+        for wall in self.walls:
+            wall_min_x, wall_min_y, wall_max_x, wall_max_y = wall.bounds
+            min_x = min(min_x, wall_min_x)
+            min_y = min(min_y, wall_min_y)
+            max_x = max(max_x, wall_max_x)
+            max_y = max(max_y, wall_max_y)
+        for body in itertools.chain(self.black_holes, self.goal_points):
+            min_x = min(min_x, body.x - body.r)
+            min_y = min(min_y, body.y - body.r)
+            max_x = max(max_x, body.x + body.r)
+            max_y = max(max_y, body.y + body.r)
+        return min_x, min_y, max_x, max_y
+
+    def can_fling(self):
+        # counted by shots fired rather than shots left on the board, as
+        # those are culled and eaten
+        return self.max_shots is not None and \
+            self.shots_added < self.max_shots
+
+    def clear(self):
+        self.aims = {}
+        self.max_shots = None
+        self.ticks = 0
+        self.elapsed = 0.
+        self.completed = False
+        self.black_holes = []
+        self.goal_points = BodyList()
+        self.shots = BodyList()
+        self.shots_added = 0
+        self.swept_paths = {}
+        self.walls = []
+
+    def collide_shots(self):
+        shots = self.shots
+        self.shot_grid.rebuild(shots)
+        for i, j in self.shot_grid.pairs():
+            shot1 = shots[i]
+            shot2 = shots[j]
+            if circles_collide(shot1, shot2):
+                shots_collide(shot1, shot2)
+                shot1.last_bounced = None
+                shot2.last_bounced = None
+
+    def collide_walls(self):
+        for shot in self.shots:
+            for wall in self.walls:
+                shot.collide_wall(wall)
+
+    @property
+    def complete(self):
+        return not self.goal_points
+
+    def cull_shots(self):
+        """remove shots that have left the board for good, and return
+        them. A shot has left when it's outside bounds() and heading
+        further out along an axis it's outside on, and either nothing
+        pulls on it or it has the energy to get ESCAPE_DISTANCE board
+        diagonals from the center of the pull before turning around"""
+        shots = self.shots
+        if not shots:
+            return []
+        min_x, min_y, max_x, max_y = self.bounds()
+
+        attractors = list(self.black_holes)
+        if self.gravity and self.gravity.shots_attract:
+            attractors.extend(shots)
+        mass = sum(attractor.mass for attractor in attractors)
+        if mass:
+            center_x = sum(attractor.x * attractor.mass
+                           for attractor in attractors) / mass
+            center_y = sum(attractor.y * attractor.mass
+                           for attractor in attractors) / mass
+            escape_distance = ESCAPE_DISTANCE * distance(min_x, min_y,
+                                                         max_x, max_y)
+
+        culled_shots = []
+        for shot in shots:
+            x = shot.x
+            y = shot.y
+            r = shot.r
+            velocity_x = shot.velocity_x
+            velocity_y = shot.velocity_y
+            if not (x + r < min_x and velocity_x <= 0 or
+                    x - r > max_x and velocity_x >= 0 or
+                    y + r < min_y and velocity_y <= 0 or
+                    y - r > max_y and velocity_y >= 0):
+                continue
+            if mass:
+                # gravity falls off as 1 / distance, so a shot moving away
+                # at speed v from distance d gets to d * e ** (v ** 2 /
+                # (2 * mass)); only the outward speed is counted, which
+                # never overestimates how far out it goes
+                away_x = x - center_x
+                away_y = y - center_y
+                d = math.sqrt(away_x * away_x + away_y * away_y)
+                if d < escape_distance:
+                    outward = away_x * velocity_x + away_y * velocity_y
+                    if outward <= 0 or (outward / d) ** 2 < \
+                            2 * mass * math.log(escape_distance / d):
+                        continue
+            culled_shots.append(shot)
+
+        for shot in culled_shots:
+            self.remove_shot(shot)
+        return culled_shots
+
+    def create_shot(self, **kwargs):
+        """make a shot that can be added to this simulation"""
+        return Shot(**kwargs)
+
+    def fling(self, start_pt, end_pt):
+        """add a shot aimed from start_pt to end_pt and released at end_pt,
+        the way FlingBoard does it; returns the shot or None"""
+        velocity = fling_velocity(start_pt, end_pt)
+        if velocity is None:
+            return None
+        shot = self.create_shot(velocity=velocity, pos=end_pt)
+        self.add_shot(shot)
+        return shot
+
+    def gravitate_shots(self, dt=1.):
+        """pull shots towards black holes; returns the shots that fell into
+        one, which are removed"""
+        removed_shots = []
+        if self.gravity:
+            self.gravity.pull(self.shots, self.black_holes, dt)
+            for shot in self.shots:
+                for black_hole in self.black_holes:
+                    if circles_collide(shot, black_hole):
+                        removed_shots.append(shot)
+                        break
+        else:
+            for shot in self.shots:
+                captured = False
+                for black_hole in self.black_holes:
+                    shot.gravitate_towards(black_hole, dt)
+                    if circles_collide(shot, black_hole):
+                        captured = True
+                if captured:
+                    removed_shots.append(shot)
+
+        for shot in removed_shots:
+            self.remove_shot(shot)
+        return removed_shots
+
+    @property
+    def idle(self):
+        """True when stepping wouldn't change anything: there are no shots
+        and no goal point is moving"""
+        if self.shots:
+            return False
+        for goal_point in self.goal_points:
+            if goal_point.moving(self.elapsed):
+                return False
+        return True
+
+    def move_goal_points(self, dt=1.):
+        """move goal points and collect the ones that were hit, in the
+        order they were hit; it's up to the caller to remove those"""
+        hits = []
+        shots = self.shots
+        swept_paths = self.swept_paths
+        self.shot_grid.rebuild(shots)
+        elapsed = self.elapsed + dt
+        for goal_point in self.goal_points:
+            if goal_point.motion:
+                goal_point.move_to(elapsed)
+            else:
+                goal_point.move(dt)
+
+            # shots that were swept could have passed right over a goal
+            # point that they are nowhere near now
+            hit_at = None
+            for shot, path in swept_paths.items():
+                t = sweep_path(path, goal_point.x, goal_point.y,
+                               goal_point.r + shot.r)
+                if t is not None and (hit_at is None or t < hit_at):
+                    hit_at = t
+
+            if hit_at is None:
+                for i in self.shot_grid.query(goal_point.x, goal_point.y,
+                                              goal_point.r):
+                    if circles_collide(goal_point, shots[i]):
+                        hit_at = 1.
+                        break
+
+            if hit_at is not None:
+                hits.append((hit_at, goal_point))
+        hits.sort(key=lambda hit: hit[0])
+        return [goal_point for t, goal_point in hits]
+
+    def move_shots(self, dt=1.):
+        walls = self.walls
+        swept_paths = self.swept_paths = {}
+        for shot in self.shots:
+            path = move_shot(shot, walls, dt)
+            if path:
+                swept_paths[shot] = path
+
+    def remove_black_hole(self, black_hole):
+        self.black_holes.remove(black_hole)
+
+    def remove_goal_point(self, goal_point):
+        self.goal_points.remove(goal_point)
+
+    def remove_shot(self, shot):
+        self.shots.remove(shot)
+
+    def remove_wall(self, wall):
+        self.walls.remove(wall)
+
+    def step(self, dt=1.):
+        """
+        advance the simulation by dt ticks; returns a tuple of (shots
+        eaten by black holes or culled, goal points that were hit). Bodies
+        are only taken out of the simulation once the phase that removes
+        them is done with them
+        """
+        profiler = self.profiler
+        if profiler:
+            profiler.begin()
+        self.collide_shots()
+        if profiler:
+            profiler.lap('shot collisions')
+        removed_shots = self.gravitate_shots(dt)
+        if profiler:
+            profiler.lap('gravity')
+        self.collide_walls()
+        if profiler:
+            profiler.lap('walls')
+        self.move_shots(dt)
+        if profiler:
+            profiler.lap('movement')
+        hit_goals = self.move_goal_points(dt)
+        for goal_point in hit_goals:
+            self.remove_goal_point(goal_point)
+        if profiler:
+            profiler.lap('goals')
+        removed_shots.extend(self.cull_shots())
+        if profiler:
+            profiler.lap('culling')
+        self.ticks += 1
+        self.elapsed += dt
+
+        if hit_goals and not self.goal_points and not self.completed:
+            self.completed = True
+            if self.on_complete:
+                self.on_complete()
+        return removed_shots, hit_goals
+
+    def touch_down(self, pos, touch_id=0):
+        """start aiming a shot from pos for touch_id, if another one is
+        allowed; returns True if aiming started. Any number of touches can
+        aim at once"""
+        if self.can_fling():
+            self.aims[touch_id] = [tuple(pos), tuple(pos)]
+            return True
+        return False
+
+    def touch_move(self, pos, touch_id=0):
+        aim = self.aims.get(touch_id)
+        if aim:
+            aim[1] = tuple(pos)
+
+    def touch_up(self, pos, touch_id=0):
+        """
+        release the shot touch_id is aiming at pos; returns a tuple of
+        (the shot that was added or None, shots that were removed to make
+        room)
+        """
+        aim = self.aims.pop(touch_id, None)
+        if not aim:
+            return None, []
+
+        velocity = fling_velocity(*aim)
+        if velocity is None:
+            return None, []
+
+        evicted_shots = []
+        if len(self.shots) > MAX_SHOTS:
+            oldest_shot = min(self.shots, key=lambda shot: shot.number)
+            evicted_shots.append(oldest_shot)
+            self.remove_shot(oldest_shot)
+
+        shot = None
+        if self.can_fling():
+            shot = self.create_shot(velocity=velocity, pos=tuple(pos))
+            self.add_shot(shot)
+        return shot, evicted_shots
@@ -0,0 +1,58 @@
+"""pools of widgets that get reused instead of built from scratch
+
+Building a kivy widget applies its kv rules and creates its canvas
+instructions, which is slow enough to cause a hitch when a level with a
+lot of bodies is (re)loaded. A WidgetPool keeps widgets that have been
+taken off the board and hands them back out, pointed at a new body.
+"""
+
+
+class WidgetPool(object):
+    """
+    Hands out widgets made by factory(body). A released widget is kept
+    (up to max_size of them) and reset(body) on its next acquire.
+    """
+
+    def __init__(self, factory, max_size=256):
+        self.factory = factory
+        self.max_size = max_size
+        self.free = []
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+        self.dropped = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    def acquire(self, body):
+        if self.free:
+            widget = self.free.pop()
+            widget.reset(body)
+            self.reused += 1
+        else:
+            widget = self.factory(body)
+            self.created += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        return widget
+
+    def release(self, widget):
+        """take back a widget that is no longer on the board"""
+        self.in_use -= 1
+        self.released += 1
+        if len(self.free) < self.max_size:
+            widget.body = None
+            self.free.append(widget)
+        else:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'released': self.released,
+            'dropped': self.dropped,
+            'free': len(self.free),
+            'in_use': self.in_use,
+            'peak_in_use': self.peak_in_use,
+        }
@@ -0,0 +1,93 @@
+"""predicted flight paths for the shots being aimed
+
+The prediction flies a lone shot past the level's black holes and walls;
+goal points and other shots don't change where it goes, so they are left
+out. Paths are memoized on a quantized grid of launch positions and
+velocities, so dragging a finger only simulates again once the aim has
+actually moved to a new grid cell.
+"""
+
+import collections
+
+from physics import Shot, circles_collide, fling_velocity, move_shot
+
+
+class TrajectoryPredictor(object):
+    def __init__(self, simulation, ticks=90, position_quantum=4.,
+                 velocity_quantum=.1, cache_size=512):
+        self.simulation = simulation
+        self.ticks = ticks
+        self.position_quantum = position_quantum
+        self.velocity_quantum = velocity_quantum
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+
+    def clear(self):
+        """forget every path; call this when the level changes"""
+        self.cache.clear()
+
+    def predict(self, pos, velocity, dt=1.):
+        """flat [x0, y0, x1, y1, ...] list of where a shot launched from
+        pos with velocity will be over the next ticks"""
+        pq = self.position_quantum
+        vq = self.velocity_quantum
+        key = (int(round(pos[0] / pq)), int(round(pos[1] / pq)),
+               int(round(velocity[0] / vq)), int(round(velocity[1] / vq)),
+               dt)
+
+        cache = self.cache
+        points = cache.pop(key, None)
+        if points is None:
+            points = self.simulate((key[0] * pq, key[1] * pq),
+                                   (key[2] * vq, key[3] * vq), dt)
+            if len(cache) >= self.cache_size:
+                cache.popitem(last=False)
+        cache[key] = points
+        return points
+
+    def predict_aim(self, aim, dt=1.):
+        """predicted path for one of a simulation's aims, or [] if there's
+        nothing to fling"""
+        if not aim:
+            return []
+        velocity = fling_velocity(*aim)
+        if velocity is None:
+            return []
+        return self.predict(aim[1], velocity, dt)
+
+    def simulate(self, pos, velocity, dt):
+        simulation = self.simulation
+        black_holes = simulation.black_holes
+        walls = simulation.walls
+        # give up on shots that are well clear of the board
+        margin = max(simulation.width, simulation.height)
+
+        shot = Shot(pos=pos, velocity=velocity)
+        shots = [shot]
+        points = [shot.x, shot.y]
+        for i in range(int(self.ticks / dt)):
+            captured = False
+            if simulation.gravity:
+                simulation.gravity.pull(shots, black_holes, dt)
+            for black_hole in black_holes:
+                if not simulation.gravity:
+                    shot.gravitate_towards(black_hole, dt)
+                if circles_collide(shot, black_hole):
+                    captured = True
+            if captured:
+                break
+            for wall in walls:
+                shot.collide_wall(wall)
+            path = move_shot(shot, walls, dt)
+            if path:
+                # show where it bounced, not just where it ended up
+                for t, x, y in path[1:-1]:
+                    points.append(x)
+                    points.append(y)
+            points.append(shot.x)
+            points.append(shot.y)
+
+            if not -margin < shot.x < simulation.width + margin or \
+               not -margin < shot.y < simulation.height + margin:
+                break
+        return points
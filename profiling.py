@@ -0,0 +1,161 @@
+"""opt-in timing of each phase of the physics tick
+
+A TickProfiler keeps the last few seconds of timings for every phase a
+simulation step goes through (shot collisions, gravity, walls, movement,
+goals and culling), plus anything else the board laps, such as widget
+syncing.
+Whenever a whole frame goes over budget, the recent frames can be dumped
+as a trace that chrome://tracing or Perfetto can open.
+"""
+
+import collections
+import json
+import math
+import os
+import time
+import timeit
+
+# upper edges, in microseconds, of the histogram buckets
+HISTOGRAM_BUCKETS_US = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+                        16667, 33333)
+
+
+def percentile(sorted_values, fraction):
+    """the value fraction of the way up sorted_values, or None if there
+    aren't any"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1,
+                int(math.ceil(fraction * len(sorted_values))) - 1)
+    return sorted_values[max(index, 0)]
+
+
+class TickProfiler(object):
+    def __init__(self, budget=1 / 60., window=600, trace_dir=None,
+                 trace_frames=60, min_trace_interval=5.):
+        self.budget = budget
+        self.window = window
+        self.trace_dir = trace_dir
+        self.min_trace_interval = min_trace_interval
+        self.samples = {}
+        self.frame_samples = collections.deque(maxlen=window)
+        self.frames = collections.deque(maxlen=trace_frames)
+        self.frame_events = []
+        self.frame_start = None
+        self.last_trace = None
+        self.mark = timeit.default_timer()
+        self.timer = timeit.default_timer
+
+    def begin(self):
+        """start timing the next phase from now"""
+        self.mark = self.timer()
+
+    def end_frame(self):
+        """finish the frame started with start_frame; returns the path of
+        the trace that was written if the frame went over budget"""
+        duration = self.timer() - self.frame_start
+        self.frame_samples.append(duration)
+        self.frames.append((self.frame_start, duration, self.frame_events))
+        self.frame_events = []
+        if duration > self.budget:
+            return self.over_budget()
+
+    def histogram(self, phase, buckets=HISTOGRAM_BUCKETS_US):
+        """list of (bucket upper edge in us, count) for a phase, with a
+        final None edge for everything slower than the last bucket"""
+        counts = [0] * (len(buckets) + 1)
+        for sample in self.samples.get(phase, ()):
+            sample_us = sample * 1e6
+            for i, edge in enumerate(buckets):
+                if sample_us <= edge:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return list(zip(tuple(buckets) + (None,), counts))
+
+    def lap(self, phase):
+        """record the time since the last lap (or begin) against phase"""
+        now = self.timer()
+        duration = now - self.mark
+        if phase not in self.samples:
+            self.samples[phase] = collections.deque(maxlen=self.window)
+        self.samples[phase].append(duration)
+        if self.frame_start is not None:
+            self.frame_events.append((phase, self.mark, duration))
+        self.mark = now
+
+    def over_budget(self):
+        if not self.trace_dir:
+            return None
+        now = time.time()
+        if self.last_trace is not None and \
+           now - self.last_trace < self.min_trace_interval:
+            return None
+        self.last_trace = now
+        path = os.path.join(self.trace_dir, 'flingy-trace-%s.json' %
+                            time.strftime('%Y%m%d-%H%M%S'))
+        self.write_trace(path)
+        return path
+
+    def start_frame(self):
+        self.frame_start = self.timer()
+        self.begin()
+
+    def summary(self):
+        """dict of phase -> mean, median, 99th percentile and max time in
+        microseconds over the rolling window; 'frame' covers whole frames"""
+        phases = dict(self.samples)
+        phases['frame'] = self.frame_samples
+        summary = {}
+        for phase, samples in phases.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            summary[phase] = {
+                'mean_us': sum(ordered) / len(ordered) * 1e6,
+                'p50_us': percentile(ordered, .5) * 1e6,
+                'p99_us': percentile(ordered, .99) * 1e6,
+                'max_us': ordered[-1] * 1e6,
+            }
+        return summary
+
+    def write_trace(self, path):
+        """write the recent frames as a chrome trace event file"""
+        events = []
+        for frame_start, duration, frame_events in self.frames:
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': frame_start * 1e6, 'dur': duration * 1e6})
+            for phase, start, phase_duration in frame_events:
+                events.append({'name': phase, 'ph': 'X', 'pid': 0,
+                               'tid': 0, 'ts': start * 1e6,
+                               'dur': phase_duration * 1e6})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events,
+                       'displayTimeUnit': 'ms'}, f)
+
+
+class StartupTimer(object):
+    """time from being created to each named milestone of starting up"""
+
+    def __init__(self):
+        self.timer = timeit.default_timer
+        self.start = self.timer()
+        self.marks = []
+
+    def mark(self, name):
+        """note that name has just finished"""
+        self.marks.append((name, self.timer()))
+
+    def report(self):
+        """a line per milestone with how long it took and the time since
+        start, then the total"""
+        lines = []
+        previous = self.start
+        for name, when in self.marks:
+            lines.append("%-16s %8.1f ms %8.1f ms" % (
+                name, (when - previous) * 1e3, (when - self.start) * 1e3))
+            previous = when
+        lines.append("%-16s %8.1f ms" % ('total', (previous - self.start) *
+                                          1e3))
+        return '\n'.join(lines)
@@ -0,0 +1,64 @@
+"""draws every shot and goal point with a couple of meshes
+
+Instead of one widget (and one kv rule, and one Ellipse) per body, a
+BodyRenderer packs all shots into one mesh and all goal points into
+another, rebuilding their vertex lists once per frame.
+"""
+
+import math
+
+from kivy.graphics import Color, Mesh
+from kivy.uix.widget import Widget
+
+from widgets import interpolate
+
+
+class BodyRenderer(Widget):
+    def __init__(self, segments=16, **kwargs):
+        super(BodyRenderer, self).__init__(**kwargs)
+        # offsets of the points around a unit circle
+        self.circle = [(math.cos(2 * math.pi * i / segments),
+                        math.sin(2 * math.pi * i / segments))
+                       for i in range(segments)]
+        self.indices = {}
+
+        # same colors as the Shot and GoalPoint rules in flingy.kv
+        with self.canvas:
+            Color(.8, .5, .5)
+            self.shot_mesh = Mesh(mode='triangles')
+            Color(0., .9, .9, .8)
+            self.goal_point_mesh = Mesh(mode='triangles')
+
+    def circle_indices(self, count):
+        """triangle fan indices for count circles, cached by count"""
+        if count not in self.indices:
+            segments = len(self.circle)
+            indices = []
+            for i in range(count):
+                center = i * (segments + 1)
+                for j in range(segments):
+                    indices.extend((center, center + 1 + j,
+                                    center + 1 + (j + 1) % segments))
+            self.indices[count] = indices
+        return self.indices[count]
+
+    def fill(self, mesh, bodies, previous_positions, alpha):
+        circle = self.circle
+        vertices = []
+        extend = vertices.extend
+        for body in bodies:
+            x, y = interpolate(previous_positions.get(body), body.pos, alpha)
+            r = body.r
+            extend((x, y, 0., 0.))
+            for offset_x, offset_y in circle:
+                extend((x + offset_x * r, y + offset_y * r, 0., 0.))
+        mesh.vertices = vertices
+        mesh.indices = self.circle_indices(len(bodies))
+
+    def update(self, shots, goal_points, previous_positions=None, alpha=1.):
+        """redraw all shots and goal points, alpha of the way from their
+        previous_positions to where they are now"""
+        previous_positions = previous_positions or {}
+        self.fill(self.shot_mesh, shots, previous_positions, alpha)
+        self.fill(self.goal_point_mesh, goal_points, previous_positions,
+                  alpha)
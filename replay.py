@@ -0,0 +1,234 @@
+"""record fling sessions to a compact binary log and play them back
+
+A FlingBoard with a Recorder writes down every level load, level clear and
+touch that reaches the simulation, along with the physics tick it happened
+on, and the tick the session ended on. The log's header has the settings
+that change how the simulation steps: the physics rate and substeps, the
+gravity engine and whether the simulation is vectorized. A Player rebuilds
+a headless simulation with those settings and feeds it the same inputs at
+the same ticks, so it lands in the same state the board did, either as
+fast as possible or in real time.
+
+    python replay.py session.fling [--realtime]
+"""
+
+import struct
+import sys
+import time
+
+import physics
+from levels import levels
+
+MAGIC = b'FLNG'
+VERSION = 1
+
+# magic, version, physics_rate, substeps, then the simulation's settings:
+# vectorized, gravity engine, shots_attract and gravity_theta
+HEADER = struct.Struct('<4sBHHBBBd')
+EVENT = struct.Struct('<BI')
+LOAD_PAYLOAD = struct.Struct('<Hdd')
+# x, y and the id of the touch, so several touches can aim at once
+TOUCH_PAYLOAD = struct.Struct('<ddI')
+
+LOAD, CLEAR, TOUCH_DOWN, TOUCH_MOVE, TOUCH_UP, END = range(6)
+
+# the flingy gravity setting for each engine number in the header
+GRAVITY_ENGINES = ('', 'exact', 'barnes-hut')
+
+
+class Recorder(object):
+    """
+    Writes events to a file object or to a newly created file at path. The
+    settings are the ones the board's simulation was made with; as on the
+    board, any gravity other than '' or 'barnes-hut' is the exact engine.
+    """
+
+    def __init__(self, path_or_file, physics_rate=60, substeps=1,
+                 vectorized=False, gravity='', gravity_theta=.5,
+                 shots_attract=False):
+        if hasattr(path_or_file, 'write'):
+            self.file = path_or_file
+        else:
+            self.file = open(path_or_file, 'wb')
+        if gravity not in GRAVITY_ENGINES:
+            gravity = 'exact'
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, physics_rate, substeps, bool(vectorized),
+            GRAVITY_ENGINES.index(gravity), bool(shots_attract),
+            gravity_theta))
+
+    def close(self, tick):
+        """end the log at tick, the simulation's tick when the session
+        stopped, and close it"""
+        self.file.write(EVENT.pack(END, tick))
+        self.file.close()
+
+    def record_clear(self, tick):
+        self.file.write(EVENT.pack(CLEAR, tick))
+
+    def record_load(self, tick, level_index, width, height):
+        self.file.write(EVENT.pack(LOAD, tick) +
+                        LOAD_PAYLOAD.pack(level_index, width, height))
+
+    def record_touch(self, kind, tick, pos, touch_id=0):
+        self.file.write(EVENT.pack(kind, tick) +
+                        TOUCH_PAYLOAD.pack(pos[0], pos[1], touch_id))
+
+
+def read_log(data):
+    """returns (physics_rate, substeps, settings, list of (kind, tick,
+    payload)), where settings is a dict of the vectorized, gravity,
+    gravity_theta and shots_attract the log was recorded with, and touches
+    have a payload of (x, y, touch id)"""
+    (magic, version, physics_rate, substeps, vectorized, engine,
+     shots_attract, gravity_theta) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a version %s fling log" % VERSION)
+    if engine >= len(GRAVITY_ENGINES):
+        raise ValueError("unknown gravity engine %s" % engine)
+    settings = {
+        'vectorized': bool(vectorized),
+        'gravity': GRAVITY_ENGINES[engine],
+        'gravity_theta': gravity_theta,
+        'shots_attract': bool(shots_attract),
+    }
+
+    events = []
+    offset = HEADER.size
+    while offset < len(data):
+        kind, tick = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        if kind == LOAD:
+            payload = LOAD_PAYLOAD.unpack_from(data, offset)
+            offset += LOAD_PAYLOAD.size
+        elif kind in (CLEAR, END):
+            payload = ()
+        else:
+            payload = TOUCH_PAYLOAD.unpack_from(data, offset)
+            offset += TOUCH_PAYLOAD.size
+        events.append((kind, tick, payload))
+    return physics_rate, substeps, settings, events
+
+
+def make_simulation(settings):
+    """a headless simulation made the way FlingyApp makes the board's from
+    the same settings"""
+    if settings['vectorized']:
+        from vectorized import VectorizedSimulation
+        simulation = VectorizedSimulation()
+    else:
+        simulation = physics.Simulation()
+    if settings['gravity']:
+        import gravity
+        if settings['gravity'] == 'barnes-hut':
+            simulation.gravity = gravity.BarnesHutGravity(
+                settings['gravity_theta'], settings['shots_attract'])
+        else:
+            simulation.gravity = gravity.ExactGravity(
+                settings['shots_attract'])
+    return simulation
+
+
+class Player(object):
+    """
+    Replays a log into a headless simulation, made with the log's
+    settings unless one is given, up to the tick the session ended on. A
+    log that was cut off before its end was written has no such tick, so
+    after its last event the simulation keeps running for run_out more
+    ticks, so shots in flight get to finish.
+    """
+
+    def __init__(self, data, simulation=None, run_out=600):
+        self.physics_rate, self.substeps, self.settings, self.events = \
+            read_log(data)
+        self.simulation = simulation or make_simulation(self.settings)
+        self.run_out = run_out
+        self.level = None
+        self.results = []
+        self.started = None
+        self.wall_ticks = 0
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path, 'rb') as f:
+            return cls(f.read(), **kwargs)
+
+    def finish_level(self):
+        if self.level is not None:
+            simulation = self.simulation
+            self.results.append({
+                'level': self.level.name,
+                'ticks': simulation.ticks,
+                'goal_points_left': len(simulation.goal_points),
+                'complete': simulation.complete,
+            })
+        self.level = None
+
+    def play(self, realtime=False):
+        """run every event in the log; returns one result dict for each
+        level that was loaded"""
+        simulation = self.simulation
+        self.results = []
+        self.started = time.time()
+        self.wall_ticks = 0
+
+        ended = False
+        for kind, tick, payload in self.events:
+            self.run_until(tick, realtime)
+
+            if kind == END:
+                ended = True
+                break
+            elif kind == LOAD:
+                self.finish_level()
+                level_index, width, height = payload
+                simulation.clear()
+                simulation.width = width
+                simulation.height = height
+                self.level = levels[level_index]
+                self.level.load(simulation)
+                simulation.max_shots = self.level.max_shots
+            elif kind == CLEAR:
+                self.finish_level()
+                simulation.clear()
+            elif kind == TOUCH_DOWN:
+                simulation.touch_down(payload[:2], payload[2])
+            elif kind == TOUCH_MOVE:
+                simulation.touch_move(payload[:2], payload[2])
+            elif kind == TOUCH_UP:
+                simulation.touch_up(payload[:2], payload[2])
+
+        if not ended:
+            self.run_until(simulation.ticks + self.run_out, realtime,
+                           stop_when_complete=True)
+        self.finish_level()
+        return self.results
+
+    def run_until(self, tick, realtime=False, stop_when_complete=False):
+        simulation = self.simulation
+        steps_per_second = self.physics_rate * self.substeps
+        dt = physics.TICKS_PER_SECOND / steps_per_second
+        while simulation.ticks < tick:
+            if stop_when_complete and self.level is not None and \
+               simulation.complete:
+                return
+            simulation.step(dt)
+            self.wall_ticks += 1
+            if realtime:
+                delay = self.started + self.wall_ticks / \
+                    float(steps_per_second) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+if __name__ == '__main__':
+    realtime = '--realtime' in sys.argv[1:]
+    for path in [arg for arg in sys.argv[1:] if arg != '--realtime']:
+        started = time.time()
+        player = Player.from_file(path)
+        results = player.play(realtime=realtime)
+        for result in results:
+            print("%(level)s: %(goal_points_left)s goal points left after "
+                  "%(ticks)s ticks" % result)
+        print("replayed %s ticks in %.3fs" % (player.wall_ticks,
+                                              time.time() - started))
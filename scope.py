@@ -0,0 +1,91 @@
+"""everything a level puts on the board, so it can all go when it ends
+
+A FlingBoard has a LevelScope for whatever is on screen, a level or the
+menu. Widgets, clock events and animations that belong to it are started
+through the scope, and dispose() removes, cancels and stops all of them at
+once, so nothing a level started is left running or referenced once it's
+gone. live_objects and resident_memory are for checking that this holds:
+FlingBoard.memory_report uses them to compare before and after a number
+of reloads.
+"""
+
+import collections
+import gc
+import os
+
+from kivy.clock import Clock
+
+
+class LevelScope(object):
+    def __init__(self, parent):
+        # the widget that the scope's widgets are added to
+        self.parent = parent
+        self.animations = []
+        self.events = []
+        self.widgets = []
+
+    def add_widget(self, widget, *args):
+        self.parent.add_widget(widget, *args)
+        self.widgets.append(widget)
+        return widget
+
+    def animate(self, animation, widget):
+        """start animation on widget"""
+        animation.start(widget)
+        self.animations.append((animation, widget))
+        return animation
+
+    def counts(self):
+        """how many of each thing the scope is holding on to"""
+        return {
+            'animations': len(self.animations),
+            'events': len(self.events),
+            'widgets': len(self.widgets),
+        }
+
+    def dispose(self):
+        """stop every animation, cancel every clock event and take every
+        widget off the board"""
+        for animation, widget in self.animations:
+            animation.cancel(widget)
+        for event in self.events:
+            event.cancel()
+        for widget in self.widgets:
+            if widget.parent:
+                widget.parent.remove_widget(widget)
+        self.animations = []
+        self.events = []
+        self.widgets = []
+
+    def remove_widget(self, widget):
+        self.parent.remove_widget(widget)
+        self.widgets.remove(widget)
+
+    def schedule_interval(self, callback, timeout):
+        event = Clock.schedule_interval(callback, timeout)
+        self.events.append(event)
+        return event
+
+    def schedule_once(self, callback, timeout=0):
+        event = Clock.schedule_once(callback, timeout)
+        self.events.append(event)
+        return event
+
+
+def live_objects():
+    """dict of type name -> number of live objects of that type that the
+    garbage collector knows of, after a collection"""
+    gc.collect()
+    return dict(collections.Counter(type(obj).__name__
+                                    for obj in gc.get_objects()))
+
+
+def resident_memory():
+    """bytes of memory the process has resident, or None where that can't
+    be found out"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
@@ -0,0 +1,196 @@
+"""search for the flings that win a level
+
+Every launch position on a grid over the board is tried with a spread of
+launch angles and speeds, each one simulated headlessly in a process pool
+until the level is won, the shot is gone or time runs out. Winning flings
+that are next to each other in the sweep are grouped into regions:
+
+    python solver.py wally orbitit --step 40 --angles 24
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+
+import physics
+from levels import level_numbers, levels
+
+
+def find_level(name):
+    """look a level up by index or by (case insensitive) class name"""
+    if name.isdigit():
+        return levels[int(name)]
+    for level in levels:
+        if level.__name__.lower() == name.lower():
+            return level
+    raise ValueError("no level called %s" % name)
+
+
+def run_fling(level, width, height, pos, velocity, max_ticks):
+    """load level onto a headless board, fling a shot from pos at
+    velocity and step until the level is won, the shot is gone or
+    max_ticks have passed; returns (simulation, goal points the level
+    started with)"""
+    simulation = physics.Simulation(width, height)
+    level.load(simulation)
+    goals = len(simulation.goal_points)
+    simulation.add_shot(simulation.create_shot(pos=pos, velocity=velocity))
+
+    while simulation.ticks < max_ticks and simulation.shots and \
+            not simulation.complete:
+        simulation.step()
+    return simulation, goals
+
+
+def simulate(job):
+    """run a single fling; job is (level index, width, height, x, y,
+    velocity_x, velocity_y, max_ticks). returns (won, ticks)"""
+    level_index, width, height, x, y, velocity_x, velocity_y, max_ticks = job
+    simulation, goals = run_fling(levels[level_index], width, height,
+                                  (x, y), (velocity_x, velocity_y),
+                                  max_ticks)
+    return simulation.complete, simulation.ticks
+
+
+def sweep(width, height, step, angles, speeds):
+    """yield (grid index, (x, y, velocity_x, velocity_y)) for every fling
+    in the sweep; the grid index is (column, row, angle, speed)"""
+    columns = int(width // step)
+    rows = int(height // step)
+    for column in range(columns):
+        x = (column + .5) * step
+        for row in range(rows):
+            y = (row + .5) * step
+            for angle_index in range(angles):
+                angle = 2 * math.pi * angle_index / angles
+                for speed_index, speed in enumerate(speeds):
+                    yield ((column, row, angle_index, speed_index),
+                           (x, y, speed * math.cos(angle),
+                            speed * math.sin(angle)))
+
+
+def group_regions(wins, angles):
+    """split winning grid indices into regions of neighbours, where
+    angles wrap around"""
+    remaining = set(wins)
+    regions = []
+    while remaining:
+        seed = remaining.pop()
+        region = [seed]
+        frontier = [seed]
+        while frontier:
+            column, row, angle, speed = frontier.pop()
+            for neighbour in (
+                    (column - 1, row, angle, speed),
+                    (column + 1, row, angle, speed),
+                    (column, row - 1, angle, speed),
+                    (column, row + 1, angle, speed),
+                    (column, row, (angle - 1) % angles, speed),
+                    (column, row, (angle + 1) % angles, speed),
+                    (column, row, angle, speed - 1),
+                    (column, row, angle, speed + 1)):
+                if neighbour in remaining:
+                    remaining.remove(neighbour)
+                    region.append(neighbour)
+                    frontier.append(neighbour)
+        regions.append(region)
+    return sorted(regions, key=len, reverse=True)
+
+
+def solve(level, width=800, height=600, step=40., angles=24,
+          speeds=(2., 4., 6., 8., 11., 14.), max_ticks=900, processes=None,
+          chunksize=64):
+    """sweep a level; returns a list of winning regions, biggest first,
+    which is empty if no fling in the sweep wins"""
+    level_index = level_numbers[level]
+    indices = []
+    jobs = []
+    flings = {}
+    for index, fling in sweep(width, height, step, angles, speeds):
+        indices.append(index)
+        flings[index] = fling
+        jobs.append((level_index, width, height) + fling + (max_ticks,))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(simulate, jobs, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+    wins = dict((index, ticks) for index, (won, ticks)
+                in zip(indices, results) if won)
+
+    regions = []
+    for region in group_regions(wins, angles):
+        fastest = min(region, key=lambda index: wins[index])
+        x, y, velocity_x, velocity_y = flings[fastest]
+        region_flings = [flings[index] for index in region]
+        regions.append({
+            'flings': len(region),
+            'x_range': (min(f[0] for f in region_flings),
+                        max(f[0] for f in region_flings)),
+            'y_range': (min(f[1] for f in region_flings),
+                        max(f[1] for f in region_flings)),
+            'angles': sorted(set(index[2] * 360. / angles
+                                 for index in region)),
+            'speeds': sorted(set(speeds[index[3]] for index in region)),
+            'fastest': {'pos': (x, y), 'velocity': (velocity_x, velocity_y),
+                        'ticks': wins[fastest]},
+        })
+    return regions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('levels', nargs='*',
+                        help='level indices or names; defaults to all')
+    parser.add_argument('--width', type=float, default=800)
+    parser.add_argument('--height', type=float, default=600)
+    parser.add_argument('--step', type=float, default=40.,
+                        help='spacing of launch positions in pixels')
+    parser.add_argument('--angles', type=int, default=24,
+                        help='launch angles to try at each position')
+    parser.add_argument('--speeds', default='2,4,6,8,11,14',
+                        help='comma separated launch speeds in px/tick')
+    parser.add_argument('--ticks', type=int, default=900,
+                        help='ticks to simulate each fling for')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes; defaults to all cores')
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    level_list = [find_level(name) for name in args.levels] or levels
+    speeds = tuple(float(speed) for speed in args.speeds.split(','))
+
+    results = {}
+    for level in level_list:
+        regions = solve(level, args.width, args.height, args.step,
+                        args.angles, speeds, args.ticks, args.processes)
+        results[level.__name__] = regions
+        if args.json:
+            continue
+        if not regions:
+            print("%s: no winning flings found" % level.__name__)
+            continue
+        print("%s: %s winning regions" % (level.__name__, len(regions)))
+        for region in regions:
+            fastest = region['fastest']
+            print("  %4s flings, x %.0f-%.0f, y %.0f-%.0f, fastest from "
+                  "(%.0f, %.0f) at (%.2f, %.2f) in %s ticks" % (
+                      region['flings'], region['x_range'][0],
+                      region['x_range'][1], region['y_range'][0],
+                      region['y_range'][1], fastest['pos'][0],
+                      fastest['pos'][1], fastest['velocity'][0],
+                      fastest['velocity'][1], fastest['ticks']))
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,70 @@
+"""star field backgrounds, drawn once into a texture
+
+A star field is three layers of points of different sizes, placed by a
+seeded generator so the same seed and size always give the same sky. Each
+field is drawn into a framebuffer once and then shown as a single
+textured rectangle; the last few fields are kept around, so going back to
+a level or resizing to a previous size doesn't draw them again.
+"""
+
+import collections
+import random
+
+from kivy.graphics import ClearBuffers, ClearColor, Color, Fbo, Point
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# how many fields to keep textures for
+CACHE_SIZE = 4
+
+# (fraction of the stars, point size) for each layer, from faint to bright
+LAYERS = ((1., .3), (1 / 3., .6), (1 / 50., 1))
+
+_fields = collections.OrderedDict()
+
+
+def star_points(seed, width, height, number_of_stars):
+    """flat [x0, y0, x1, y1, ...] point lists, one per layer"""
+    layers = []
+    if numpy is not None:
+        state = numpy.random.RandomState(seed)
+        for fraction, point_size in LAYERS:
+            count = int(number_of_stars * fraction)
+            points = state.random_sample((count, 2)) * (width, height)
+            layers.append(points.ravel().tolist())
+    else:
+        generator = random.Random(seed)
+        uniform = generator.random
+        for fraction, point_size in LAYERS:
+            count = int(number_of_stars * fraction)
+            layers.append([uniform() * (height if i & 1 else width)
+                           for i in range(2 * count)])
+    return layers
+
+
+def star_texture(seed, width, height, number_of_stars):
+    """texture of the star field for seed at this size, drawn the first
+    time it's asked for"""
+    size = (int(width), int(height))
+    key = (seed, size, number_of_stars)
+    fbo = _fields.pop(key, None)
+    if fbo is None:
+        fbo = Fbo(size=size)
+        with fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            Color(1., 1., 1.)
+            for (fraction, point_size), points in zip(
+                    LAYERS, star_points(seed, size[0], size[1],
+                                        number_of_stars)):
+                Point(points=points, pointsize=point_size)
+        fbo.draw()
+        if len(_fields) >= CACHE_SIZE:
+            _fields.popitem(last=False)
+    # the fbo is cached rather than its texture, so that kivy can redraw
+    # it if the gl context is lost
+    _fields[key] = fbo
+    return fbo.texture
@@ -0,0 +1,365 @@
+"""numpy backed simulation that keeps every shot in a set of flat arrays
+
+Gravity from every black hole is applied to every shot in one batched
+operation per tick, and shots move in a single array add. Finding the shots
+that touch each other or a goal point, and the ones that have left the
+board, is done on the arrays too. Everything else works on ArrayShot
+objects, which read and write through to the arrays, so they can be used
+anywhere a physics.Shot can.
+"""
+
+import itertools
+
+import physics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ShotArrays(object):
+    """struct-of-arrays storage for the state of all live shots"""
+    fields = ('x', 'y', 'velocity_x', 'velocity_y', 'r', 'mass',
+              'last_bounced_ticks')
+
+    def __init__(self, capacity=64):
+        if numpy is None:
+            raise ImportError("numpy is needed for vectorized simulation")
+
+        self.capacity = capacity
+        self.count = 0
+        self.owners = []
+        for field in self.fields:
+            setattr(self, field, numpy.zeros(capacity))
+
+    def allocate(self, shot):
+        """reserve a slot for shot and return its index"""
+        if self.count == self.capacity:
+            self.grow()
+        index = self.count
+        self.count += 1
+        self.owners.append(shot)
+        self.r[index] = physics.Shot.r
+        self.mass[index] = physics.Shot.mass
+        return index
+
+    def free(self, shot):
+        """release the slot used by shot, moving the last shot into it"""
+        index = shot.index
+        last = self.count - 1
+        if index != last:
+            for field in self.fields:
+                array = getattr(self, field)
+                array[index] = array[last]
+            moved_shot = self.owners[last]
+            moved_shot.index = index
+            self.owners[index] = moved_shot
+        self.owners.pop()
+        self.count = last
+        shot.index = None
+
+    def grow(self):
+        self.capacity *= 2
+        for field in self.fields:
+            array = getattr(self, field)
+            grown = numpy.zeros(self.capacity)
+            grown[:self.count] = array[:self.count]
+            setattr(self, field, grown)
+
+
+def _array_property(field):
+    def get(self):
+        return float(getattr(self.arrays, field)[self.index])
+
+    def set(self, value):
+        getattr(self.arrays, field)[self.index] = value
+
+    return property(get, set)
+
+
+class ArrayShot(physics.Shot):
+    """a shot whose state lives in a ShotArrays"""
+    x = _array_property('x')
+    y = _array_property('y')
+    velocity_x = _array_property('velocity_x')
+    velocity_y = _array_property('velocity_y')
+    r = _array_property('r')
+    mass = _array_property('mass')
+    last_bounced_ticks = _array_property('last_bounced_ticks')
+
+    def __init__(self, arrays, **kwargs):
+        self.arrays = arrays
+        self.index = arrays.allocate(self)
+        super(ArrayShot, self).__init__(**kwargs)
+
+
+class VectorizedSimulation(physics.Simulation):
+    """
+    A physics.Simulation that steps gravity and movement for all shots at
+    once. Shots have to be made with create_shot so they are backed by
+    this simulation's arrays.
+    """
+    def __init__(self, *args, **kwargs):
+        super(VectorizedSimulation, self).__init__(*args, **kwargs)
+        self.shot_arrays = ShotArrays()
+        self.black_hole_arrays = None
+
+    def add_black_hole(self, black_hole):
+        super(VectorizedSimulation, self).add_black_hole(black_hole)
+        self.black_hole_arrays = None
+
+    def clear(self):
+        super(VectorizedSimulation, self).clear()
+        self.shot_arrays = ShotArrays()
+        self.black_hole_arrays = None
+
+    def collide_shots(self):
+        """bounce touching shots off of each other, in the same order
+        physics.Simulation does"""
+        arrays = self.shot_arrays
+        n = arrays.count
+        if n < 2:
+            return
+        x = arrays.x[:n]
+        y = arrays.y[:n]
+        r = arrays.r[:n]
+
+        # with cells as wide as the widest shot, shots can only touch if
+        # their centers are in the same cell or next to each other
+        size = 2. * r.max() or 1.
+        cells = {}
+        for i, cell in enumerate(zip(
+                numpy.floor(x / size).astype(int).tolist(),
+                numpy.floor(y / size).astype(int).tolist())):
+            if cell in cells:
+                cells[cell].append(i)
+            else:
+                cells[cell] = [i]
+        first = []
+        second = []
+        for (cell_x, cell_y), members in cells.items():
+            for i, j in itertools.combinations(members, 2):
+                first.append(i)
+                second.append(j)
+            # half the neighbouring cells, so each pair comes up once
+            for offset_x, offset_y in ((1, -1), (1, 0), (1, 1), (0, 1)):
+                neighbours = cells.get((cell_x + offset_x, cell_y + offset_y))
+                if neighbours:
+                    for i in members:
+                        for j in neighbours:
+                            first.append(i)
+                            second.append(j)
+        if not first:
+            return
+
+        first = numpy.array(first)
+        second = numpy.array(second)
+        touching = (x[first] - x[second]) ** 2 + \
+            (y[first] - y[second]) ** 2 < (r[first] + r[second]) ** 2
+        low = numpy.minimum(first, second)[touching]
+        high = numpy.maximum(first, second)[touching]
+        owners = arrays.owners
+        for k in numpy.lexsort((high, low)):
+            shot1 = owners[low[k]]
+            shot2 = owners[high[k]]
+            physics.shots_collide(shot1, shot2)
+            shot1.last_bounced = None
+            shot2.last_bounced = None
+
+    def collide_walls(self):
+        """bounce shots off of walls, only calling Shot.collide_wall for
+        the shots inside a wall's bounding box, which it would otherwise
+        return early for"""
+        arrays = self.shot_arrays
+        n = arrays.count
+        walls = self.walls
+        if not n or not walls:
+            return
+        x = arrays.x[:n]
+        y = arrays.y[:n]
+        r = arrays.r[:n]
+        near = numpy.empty((n, len(walls)), dtype=bool)
+        for index, wall in enumerate(walls):
+            margin = r + wall.thickness / 2.
+            min_x, min_y, max_x, max_y = wall.bounds
+            near[:, index] = ~((x < min_x - margin) | (x > max_x + margin) |
+                               (y < min_y - margin) | (y > max_y + margin))
+        owners = arrays.owners
+        for i in numpy.flatnonzero(near.any(axis=1)):
+            shot = owners[i]
+            for index in numpy.flatnonzero(near[i]):
+                shot.collide_wall(walls[index])
+
+    def create_shot(self, **kwargs):
+        return ArrayShot(self.shot_arrays, **kwargs)
+
+    def cull_shots(self):
+        """remove shots that have left the board for good, and return
+        them; see physics.Simulation.cull_shots"""
+        arrays = self.shot_arrays
+        n = arrays.count
+        if not n:
+            return []
+        min_x, min_y, max_x, max_y = self.bounds()
+        x = arrays.x[:n]
+        y = arrays.y[:n]
+        r = arrays.r[:n]
+        velocity_x = arrays.velocity_x[:n]
+        velocity_y = arrays.velocity_y[:n]
+        culled = ((x + r < min_x) & (velocity_x <= 0)) | \
+            ((x - r > max_x) & (velocity_x >= 0)) | \
+            ((y + r < min_y) & (velocity_y <= 0)) | \
+            ((y - r > max_y) & (velocity_y >= 0))
+        if not culled.any():
+            return []
+
+        mass = sum(black_hole.mass for black_hole in self.black_holes)
+        moment_x = sum(black_hole.x * black_hole.mass
+                       for black_hole in self.black_holes)
+        moment_y = sum(black_hole.y * black_hole.mass
+                       for black_hole in self.black_holes)
+        if self.gravity and self.gravity.shots_attract:
+            shot_mass = arrays.mass[:n]
+            mass += shot_mass.sum()
+            moment_x += (x * shot_mass).sum()
+            moment_y += (y * shot_mass).sum()
+        if mass:
+            escape_distance = physics.ESCAPE_DISTANCE * physics.distance(
+                min_x, min_y, max_x, max_y)
+            away_x = x - moment_x / mass
+            away_y = y - moment_y / mass
+            d = numpy.sqrt(away_x ** 2 + away_y ** 2)
+            outward = away_x * velocity_x + away_y * velocity_y
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                turns_back = (d < escape_distance) & (
+                    (outward <= 0) | ((outward / d) ** 2 < 2 * mass *
+                                      numpy.log(escape_distance / d)))
+            culled &= ~turns_back
+
+        culled_shots = [arrays.owners[i] for i in numpy.flatnonzero(culled)]
+        for shot in culled_shots:
+            self.remove_shot(shot)
+        return culled_shots
+
+    def gravitate(self, dt=1.):
+        """apply gravity from every black hole to every shot; returns a
+        boolean array of the shots that fell into a black hole"""
+        if self.black_hole_arrays is None:
+            self.black_hole_arrays = tuple(
+                numpy.array([getattr(black_hole, field)
+                             for black_hole in self.black_holes], dtype=float)
+                for field in ('x', 'y', 'r', 'mass'))
+        hole_x, hole_y, hole_r, hole_mass = self.black_hole_arrays
+
+        arrays = self.shot_arrays
+        n = arrays.count
+        gravity_x = hole_x - arrays.x[:n, numpy.newaxis]
+        gravity_y = hole_y - arrays.y[:n, numpy.newaxis]
+        length2 = gravity_x ** 2 + gravity_y ** 2
+        # add each black hole's pull in turn, same as the per-shot code
+        # does, so both produce identical trajectories
+        for pull_x, pull_y in zip((gravity_x / length2 * hole_mass * dt).T,
+                                  (gravity_y / length2 * hole_mass * dt).T):
+            arrays.velocity_x[:n] += pull_x
+            arrays.velocity_y[:n] += pull_y
+
+        return (length2 < (arrays.r[:n, numpy.newaxis] + hole_r) ** 2).any(
+            axis=1)
+
+    def gravitate_shots(self, dt=1.):
+        if self.gravity:
+            return super(VectorizedSimulation, self).gravitate_shots(dt)
+        arrays = self.shot_arrays
+        if not self.black_holes or not arrays.count:
+            return []
+
+        captured = self.gravitate(dt)
+        removed_shots = [arrays.owners[i] for i in numpy.flatnonzero(captured)]
+        for shot in removed_shots:
+            self.remove_shot(shot)
+        return removed_shots
+
+    def move_goal_points(self, dt=1.):
+        """move goal points and collect the ones that were hit, in the
+        order they were hit; see physics.Simulation.move_goal_points"""
+        goal_points = self.goal_points
+        elapsed = self.elapsed + dt
+        for goal_point in goal_points:
+            if goal_point.motion:
+                goal_point.move_to(elapsed)
+            else:
+                goal_point.move(dt)
+
+        arrays = self.shot_arrays
+        n = arrays.count
+        touching = None
+        if n and goal_points:
+            goal_x, goal_y, goal_r = (
+                numpy.array([getattr(goal_point, field)
+                             for goal_point in goal_points],
+                            dtype=float)[:, numpy.newaxis]
+                for field in ('x', 'y', 'r'))
+            touching = ((arrays.x[:n] - goal_x) ** 2 +
+                        (arrays.y[:n] - goal_y) ** 2 <
+                        (arrays.r[:n] + goal_r) ** 2).any(axis=1)
+
+        hits = []
+        swept_paths = self.swept_paths
+        for index, goal_point in enumerate(goal_points):
+            # shots that were swept could have passed right over a goal
+            # point that they are nowhere near now
+            hit_at = None
+            for shot, path in swept_paths.items():
+                t = physics.sweep_path(path, goal_point.x, goal_point.y,
+                                       goal_point.r + shot.r)
+                if t is not None and (hit_at is None or t < hit_at):
+                    hit_at = t
+            if hit_at is None and touching is not None and touching[index]:
+                hit_at = 1.
+            if hit_at is not None:
+                hits.append((hit_at, goal_point))
+        hits.sort(key=lambda hit: hit[0])
+        return [goal_point for t, goal_point in hits]
+
+    def move_shots(self, dt=1.):
+        arrays = self.shot_arrays
+        n = arrays.count
+        swept_paths = self.swept_paths = {}
+        # shots that could pass through a wall or a goal point in one move
+        # are swept, the same as physics.move_shot does
+        velocity_x = arrays.velocity_x[:n]
+        velocity_y = arrays.velocity_y[:n]
+        fast = (velocity_x ** 2 + velocity_y ** 2) * (dt * dt) > \
+            arrays.r[:n] ** 2
+        if not self.walls:
+            # with nothing to bounce off of a sweep is a straight line, so
+            # every shot still moves at once
+            for i in numpy.flatnonzero(fast):
+                shot = arrays.owners[i]
+                swept_paths[shot] = [(0., shot.x, shot.y)]
+            arrays.x[:n] += velocity_x * dt
+            arrays.y[:n] += velocity_y * dt
+            arrays.last_bounced_ticks[:n] += dt
+            for shot, path in swept_paths.items():
+                path.append((1., shot.x, shot.y))
+            return
+
+        # with walls, the fast shots are swept one at a time and the rest
+        # still move all at once
+        arrays.x[:n] += numpy.where(fast, 0., velocity_x * dt)
+        arrays.y[:n] += numpy.where(fast, 0., velocity_y * dt)
+        arrays.last_bounced_ticks[:n] += numpy.where(fast, 0., dt)
+        for i in numpy.flatnonzero(fast):
+            shot = arrays.owners[i]
+            path = physics.move_shot(shot, self.walls, dt)
+            if path:
+                swept_paths[shot] = path
+
+    def remove_black_hole(self, black_hole):
+        super(VectorizedSimulation, self).remove_black_hole(black_hole)
+        self.black_hole_arrays = None
+
+    def remove_shot(self, shot):
+        super(VectorizedSimulation, self).remove_shot(shot)
+        self.shot_arrays.free(shot)